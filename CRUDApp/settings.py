@@ -57,11 +57,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'website.middleware.RequestMetricsMiddleware',
+    'website.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'website.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'website.middleware.ReadReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'website.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -70,10 +74,15 @@ ROOT_URLCONF = 'CRUDApp.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for the request metrics (website/metrics.py)
+        'BACKEND': 'website.metrics.DjangoTemplates',
+        'NAME': 'django',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # cached + compacting loader: see website/loaders.py
+            'loaders': [
+                ('django.template.loaders.cached.Loader', ['website.loaders.CompactLoader']),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -83,19 +92,45 @@ TEMPLATES = [
     },
 ]
 
+# Strip indentation from HTML templates when they load (website/loaders.py)
+COMPACT_TEMPLATES = os.getenv("DJANGO_COMPACT_TEMPLATES", "1") == "1"
+
+# gzip/brotli responses (website/middleware.py); turn off when a proxy in front compresses
+COMPRESSION = os.getenv("DJANGO_COMPRESSION", "1") == "1"
+# smaller bodies gain too little to be worth the CPU
+COMPRESSION_MIN_SIZE = int(os.getenv("DJANGO_COMPRESSION_MIN_SIZE", "512"))
+
 WSGI_APPLICATION = 'CRUDApp.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# "production" turns on WAL, tuned pragmas and BEGIN IMMEDIATE writes (see website/sqlite.py)
+SQLITE_PROFILE = os.getenv("DJANGO_SQLITE_PROFILE", "")
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Django's SQLite backend plus BEGIN IMMEDIATE under the production profile (website/sqlite.py)
+        'ENGINE': 'website.sqlite_backend',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # keep connections (and their pragmas and page cache) across requests
+        'CONN_MAX_AGE': int(os.getenv("DJANGO_CONN_MAX_AGE", "600" if SQLITE_PROFILE == "production" else "0")),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas: comma-separated SQLite files kept in sync with the primary by an
+# external replicator (e.g. LiteFS/Litestream). Safe-method requests read from them
+# (website/routers.py); a session that just wrote reads from the primary for
+# READ_REPLICA_PIN_SECONDS so it sees its own changes.
+READ_REPLICAS = []
+for _number, _name in enumerate(filter(None, os.getenv("DJANGO_READ_REPLICAS", "").split(",")), start=1):
+    DATABASES[f'replica{_number}'] = {**DATABASES['default'], 'NAME': _name, 'TEST': {'MIRROR': 'default'}}
+    READ_REPLICAS.append(f'replica{_number}')
+READ_REPLICA_PIN_SECONDS = int(os.getenv("DJANGO_READ_REPLICA_PIN_SECONDS", "5"))
+DATABASE_ROUTERS = ['website.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,13 +163,118 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# "fragments" holds rendered template fragments such as record cards. LocMemCache
+# evicts least-recently-used entries once MAX_ENTRIES is reached; point the backend
+# at Redis/Memcached to share fragments between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', ''),
+    },
+    'fragments': {
+        'BACKEND': os.getenv('DJANGO_FRAGMENT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_FRAGMENT_CACHE_LOCATION', 'fragments'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('DJANGO_FRAGMENT_CACHE_MAX_ENTRIES', '5000')),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
+# Anonymous visitors get the home page from the default cache for this many seconds
+# (website/pagecache.py; 0 disables). Creating or deleting records refreshes it sooner.
+PAGE_CACHE_SECONDS = int(os.getenv("DJANGO_PAGE_CACHE_SECONDS", "30"))
+# How long past that an expired copy may still be served while one request re-renders it
+PAGE_CACHE_STALE_SECONDS = int(os.getenv("DJANGO_PAGE_CACHE_STALE_SECONDS", "60"))
+
+
+# Sessions and auth
+# e.g. django.contrib.sessions.backends.cached_db or .signed_cookies to skip the
+# django_session query on most requests
+SESSION_ENGINE = os.getenv('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+# Seconds a logged-in user's auth_user row is served from the default cache
+# (website/auth.py); 0 reads it from the database on every request
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('DJANGO_AUTH_USER_CACHE_TIMEOUT', '60'))
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# "1": collectstatic fingerprints and precompresses into STATIC_ROOT and the app serves it
+# (website/storage.py); run collectstatic before starting the server
+STATIC_PIPELINE = os.getenv("DJANGO_STATIC_PIPELINE", "0") == "1"
+# Cache lifetime of static files without a content hash in their name
+STATIC_MAX_AGE = int(os.getenv("DJANGO_STATIC_MAX_AGE", "60"))
+# Files left out of the manifest are deleted by collectstatic after this many days
+STATIC_PRUNE_DAYS = int(os.getenv("DJANGO_STATIC_PRUNE_DAYS", "7"))
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": "website.storage.CompressedManifestStorage" if STATIC_PIPELINE
+        else "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Records workspace
+# Cards per page on the records list (keyset pagination, see website/pagination.py)
+RECORDS_PAGE_SIZE = int(os.getenv("DJANGO_RECORDS_PAGE_SIZE", "24"))
+# Rows per page in the staff user directory (manage/users)
+USERS_PAGE_SIZE = int(os.getenv("DJANGO_USERS_PAGE_SIZE", "50"))
+# Icon rendering for {% icon %}: "" (full inline SVGs), "inline" (one <symbol> sheet per
+# page, icons become <use> references) or "external" (<use> into the cacheable /icons/sprite.svg)
+UI_ICONS_SPRITE = os.getenv("DJANGO_UI_ICONS_SPRITE", "")
+# Serve home, dashboard and record_detail from website/async_views.py (CRUDApp/asgi.py turns this on)
+ASYNC_VIEWS = os.getenv("DJANGO_ASYNC_VIEWS", "0") == "1"
+# Threads (and so at most that many kept-open DB connections) the async views read on
+ASYNC_READ_THREADS = int(os.getenv("DJANGO_ASYNC_READ_THREADS", "8"))
+# Batch JSON API (website/api.py): largest page a GET may ask for, most operations per POST
+RECORDS_API_MAX_PAGE_SIZE = int(os.getenv("DJANGO_RECORDS_API_MAX_PAGE_SIZE", "1000"))
+RECORDS_API_MAX_BATCH = int(os.getenv("DJANGO_RECORDS_API_MAX_BATCH", "5000"))
+# Days of record changes kept by `manage.py compact_changes`; feed cursors older than that get 410
+RECORD_CHANGES_RETENTION_DAYS = int(os.getenv("DJANGO_RECORD_CHANGES_RETENTION_DAYS", "30"))
+# Live records page (website/live.py): "" keeps events in-process (one ASGI worker);
+# a redis:// URL shares them between workers
+LIVE_EVENTS_BROKER = os.getenv("DJANGO_LIVE_EVENTS_BROKER", "")
+# Events a slow stream may fall behind before it is dropped (and catches up on reconnect)
+LIVE_EVENTS_QUEUE = int(os.getenv("DJANGO_LIVE_EVENTS_QUEUE", "100"))
+# Seconds between keep-alive comments, and the most a stream stays open before reconnecting
+LIVE_EVENTS_HEARTBEAT = int(os.getenv("DJANGO_LIVE_EVENTS_HEARTBEAT", "15"))
+LIVE_EVENTS_MAX_AGE = int(os.getenv("DJANGO_LIVE_EVENTS_MAX_AGE", "300"))
+# Rows fetched per database round trip when streaming a records export
+RECORDS_EXPORT_CHUNK_SIZE = int(os.getenv("DJANGO_RECORDS_EXPORT_CHUNK_SIZE", "2000"))
+
+
+# Request metrics (website/metrics.py, shown at /manage/metrics)
+# Share of requests timed; 1.0 records every request
+METRICS_SAMPLE_RATE = float(os.getenv("DJANGO_METRICS_SAMPLE_RATE", "1.0"))
+# Requests slower than this (ms) log their slowest queries to the "website.metrics" logger
+METRICS_SLOW_REQUEST_MS = float(os.getenv("DJANGO_METRICS_SLOW_REQUEST_MS", "500"))
+# Bearer token a Prometheus scraper can send instead of a staff session ("" disables it)
+METRICS_TOKEN = os.getenv("DJANGO_METRICS_TOKEN", "")
+
+
+# Dashboard trends (website/activity.py): today's row is recounted on write at most this often (seconds, per process)
+ACTIVITY_REFRESH_SECONDS = int(os.getenv("DJANGO_ACTIVITY_REFRESH_SECONDS", "10"))
+
+
+# Background jobs (website/jobs.py, run by `manage.py run_worker`, listed at /manage/jobs)
+JOBS_WORKER_PROCESSES = int(os.getenv("DJANGO_JOBS_WORKER_PROCESSES", "1"))
+JOBS_WORKER_THREADS = int(os.getenv("DJANGO_JOBS_WORKER_THREADS", "2"))
+# Seconds a claimed job may run before another worker may take it over
+JOBS_LEASE_SECONDS = int(os.getenv("DJANGO_JOBS_LEASE_SECONDS", "600"))
+# Seconds before the first retry of a failed job; doubles with each attempt
+JOBS_RETRY_BACKOFF = float(os.getenv("DJANGO_JOBS_RETRY_BACKOFF", "10"))
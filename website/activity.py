@@ -0,0 +1,146 @@
+"""
+Daily activity rollups behind the dashboard trend charts.
+
+One ``DailyActivity`` row per day counts records created, records updated
+(edited after the day they were created), users joined and users active. A
+write only recounts today's row: a range count over today's rows on the
+created/updated/joined/last-login indexes, at most every
+ACTIVITY_REFRESH_SECONDS per process. The first recount of a day also closes
+out yesterday, picking up writes that came in under the throttle.
+
+Counts only ever grow. ``updated_at`` and ``last_login`` remember just the
+latest event, so a record edited again today drops out of yesterday's recount;
+keeping the larger number keeps what was seen. For the same reason
+``manage.py backfill_activity`` can only approximate days it never saw.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyActivity, Record
+
+COLUMNS = ('records_created', 'records_updated', 'users_joined', 'users_active')
+SERIES = (
+    ('records_created', 'Records created', 'from-sky-500 to-indigo-500'),
+    ('records_updated', 'Records updated', 'from-violet-500 to-purple-500'),
+    ('users_joined', 'Users joined', 'from-emerald-500 to-emerald-400'),
+    ('users_active', 'Users active', 'from-amber-500 to-orange-400'),
+)
+TREND_DAYS = (30, 90)
+
+
+def _bounds(first_day, last_day=None):
+    tz = timezone.get_current_timezone()
+    start = datetime.datetime.combine(first_day, datetime.time.min, tzinfo=tz)
+    end = datetime.datetime.combine((last_day or first_day) + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz)
+    return start, end
+
+
+def _count_day(day):
+    start, end = _bounds(day)
+
+    def within(field):
+        return Q(**{f'{field}__gte': start, f'{field}__lt': end})
+
+    records = Record.objects.filter(within('created_at') | within('updated_at')).aggregate(
+        records_created=Count('id', filter=within('created_at')),
+        records_updated=Count('id', filter=within('updated_at') & Q(created_at__lt=start)),
+    )
+    users = User.objects.filter(within('date_joined') | within('last_login')).aggregate(
+        users_joined=Count('id', filter=within('date_joined')),
+        users_active=Count('id', filter=within('last_login')),
+    )
+    return {**records, **users}
+
+
+def _store(counts_by_day):
+    """Write ``{day: {column: n}}``, keeping the larger of the stored and new count."""
+    with transaction.atomic():
+        existing = DailyActivity.objects.in_bulk(list(counts_by_day))
+        created, updated = [], []
+        for day, counts in counts_by_day.items():
+            row = existing.get(day)
+            if row is None:
+                created.append(DailyActivity(day=day, **counts))
+                continue
+            for column in COLUMNS:
+                setattr(row, column, max(getattr(row, column), counts.get(column, 0)))
+            updated.append(row)
+        DailyActivity.objects.bulk_create(created, batch_size=500)
+        DailyActivity.objects.bulk_update(updated, COLUMNS, batch_size=500)
+    return len(created)
+
+
+def refresh(day):
+    """Recount one day's row. Returns True if the row is new."""
+    return bool(_store({day: _count_day(day)}))
+
+
+def refresh_today():
+    today = timezone.localdate()
+    timeout = settings.ACTIVITY_REFRESH_SECONDS
+    if timeout and not cache.add(f'activity:refreshed:{today}', True, timeout):
+        return
+    if refresh(today):
+        refresh(today - datetime.timedelta(days=1))
+
+
+def schedule_refresh():
+    # after commit, so the recount sees the write; a failed recount mustn't fail the write
+    transaction.on_commit(refresh_today, robust=True)
+
+
+def backfill(first_day, last_day):
+    """Count every day in the range with one grouped query per column. Returns the number of days."""
+    start, end = _bounds(first_day, last_day)
+    sources = {
+        'records_created': (Record, 'created_at'),
+        'records_updated': (Record, 'updated_at'),
+        'users_joined': (User, 'date_joined'),
+        'users_active': (User, 'last_login'),
+    }
+    counts = defaultdict(dict)
+    for column, (model, field) in sources.items():
+        rows = model.objects.filter(**{f'{field}__gte': start, f'{field}__lt': end}).annotate(day=TruncDate(field))
+        if column == 'records_updated':
+            rows = rows.annotate(created_day=TruncDate('created_at')).filter(created_day__lt=F('day'))
+        for day, n in rows.order_by().values('day').annotate(n=Count('id')).values_list('day', 'n'):
+            counts[day][column] = n
+    days = [first_day + datetime.timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    _store({day: counts.get(day, {}) for day in days})
+    return len(days)
+
+
+def trend(days, today=None):
+    """The last ``days`` rows up to today, with empty days filled in."""
+    today = today or timezone.localdate()
+    first = today - datetime.timedelta(days=days - 1)
+    rows = {row.day: row for row in DailyActivity.objects.filter(day__gte=first, day__lte=today)}
+    days = [first + datetime.timedelta(days=i) for i in range(days)]
+    return [rows.get(day) or DailyActivity(day=day) for day in days]
+
+
+def chart(rows):
+    """Bar heights (percent of each series' peak) for the dashboard."""
+    series = []
+    for column, label, accent in SERIES:
+        values = [getattr(row, column) for row in rows]
+        peak = max(values, default=0)
+        series.append({
+            "label": label,
+            "accent": accent,
+            "total": sum(values),
+            "peak": peak,
+            "bars": [
+                {"day": row.day, "value": value, "height": round(100 * value / peak) if peak else 0}
+                for row, value in zip(rows, values)
+            ],
+        })
+    return series
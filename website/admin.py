@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Record
+from .models import DailyActivity, Job, Record
 
 
 @admin.register(Record)
@@ -7,3 +7,15 @@ class RecordAdmin(admin.ModelAdmin):
     list_display = ("title", "created_by", "created_at")
     search_fields = ("title", "description")
     list_filter = ("created_at",)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_after", "updated_at")
+    list_filter = ("status", "name")
+
+
+@admin.register(DailyActivity)
+class DailyActivityAdmin(admin.ModelAdmin):
+    list_display = ("day", "records_created", "records_updated", "users_joined", "users_active")
+    date_hierarchy = "day"
@@ -0,0 +1,334 @@
+"""
+Batch JSON API for records, mounted at manage/api/records.
+
+GET pages through records with a cursor:
+
+    GET manage/api/records?fields=id,title&q=budget&limit=500&after=<next>
+    -> {"results": [{"id": 7, "title": "..."}, ...], "next": "<cursor>" | null}
+    -> 400 {"error": "Invalid cursor."} for a cursor that is malformed or from another q
+
+POST applies a batch of changes in one transaction, all or nothing:
+
+    POST manage/api/records
+    {"create": [{"title": "...", "description": "..."}],
+     "update": [{"id": 7, "title": "..."}],
+     "delete": [8, 9]}
+    -> 200 {"created": [ids], "updated": [ids], "deleted": [ids]}
+    -> 400 {"errors": [{"op": "update", "index": 0, "id": 7, "errors": {"title": [...]}}]}
+
+An update writes only the fields it names, over the row as it is when the
+batch commits. "updated" and "deleted" list the rows the batch actually
+changed: one another writer deleted first is left out.
+
+GET manage/api/records/changes streams what changed after a cursor, as NDJSON:
+
+    GET manage/api/records/changes?since=<cursor>&fields=id,title
+    -> {"cursor": 41, "op": "update", "id": 7, "record": {"id": 7, "title": "..."}}
+       {"cursor": 42, "op": "delete", "id": 8, "record": null}
+    -> 410 {"error": "...", "horizon": 40} when the cursor predates compaction
+
+Records are served as they are now, not as they were at the event, and a
+create may have been compacted into a later update: apply creates and updates
+as upserts. Both GET endpoints send the newest cursor as X-Changes-Cursor; a
+full sync keeps the one from its first list page and follows the feed from
+there.
+
+Callers authenticate with a staff session (and send the CSRF token, like the
+HTML forms) or with HTTP Basic credentials of a staff user. A successful
+Basic check is cached for AUTH_USER_CACHE_TIMEOUT (see auth.authenticate_basic),
+so paging through a sync doesn't hash the password on every request.
+"""
+import base64
+import binascii
+import functools
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+from . import auth, changes, counters
+from .forms import RecordForm
+from .models import Record, RecordChange
+from .pagination import KeysetPaginator
+from .search import search_records
+from .sqlite import retry_on_locked
+
+# API field name -> values() lookup
+FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'created_by': 'created_by__username',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+EDITABLE = ('title', 'description')
+
+
+def _error(status, message, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def _basic_auth_user(request):
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'basic':
+        return None
+    try:
+        username, _, password = base64.b64decode(credentials).decode().partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return auth.authenticate_basic(request, username, password)
+
+
+def api_staff_required(view):
+    """Session or HTTP Basic auth for staff; CSRF is still enforced for sessions."""
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user = None
+        if 'Authorization' in request.headers:
+            user = _basic_auth_user(request)
+        elif request.user.is_authenticated:
+            user = request.user
+            rejected = CsrfViewMiddleware(lambda req: None).process_view(request, None, (), {})
+            if rejected is not None:
+                return _error(403, 'CSRF verification failed.')
+        if user is None:
+            response = _error(401, 'Authentication required.')
+            response['WWW-Authenticate'] = 'Basic realm="records"'
+            return response
+        if not (user.is_active and user.is_staff):
+            return _error(403, 'Staff access required.')
+        request.user = user
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@api_staff_required
+def records(request):
+    if request.method == 'GET':
+        return _list(request)
+    if request.method == 'POST':
+        return _batch(request)
+    response = _error(405, 'Method not allowed.')
+    response['Allow'] = 'GET, POST'
+    return response
+
+
+def _fields(request):
+    """The requested API field names, or a 400 response."""
+    names = [name for name in request.GET.get('fields', '').split(',') if name] or list(FIELDS)
+    unknown = sorted(set(names) - set(FIELDS))
+    if unknown:
+        return _error(400, f"Unknown fields: {', '.join(unknown)}.", fields=list(FIELDS))
+    return names
+
+
+def _list(request):
+    names = _fields(request)
+    if isinstance(names, JsonResponse):
+        return names
+    try:
+        limit = min(int(request.GET.get('limit', settings.RECORDS_PAGE_SIZE)), settings.RECORDS_API_MAX_PAGE_SIZE)
+    except ValueError:
+        return _error(400, 'limit must be an integer.')
+    if limit < 1:
+        return _error(400, 'limit must be positive.')
+
+    # read before the page, so following the feed from here misses nothing
+    cursor = changes.head()
+    queryset, ordering = search_records(Record.objects.all(), request.GET.get('q', '').strip())
+    keys = [key.lstrip('-') for key in ordering]
+    # only the requested columns, plus the ordering keys the cursor is built from
+    rows = queryset.values(*{FIELDS[name] for name in names}, *keys)
+    paginator = KeysetPaginator(rows, ordering=ordering, per_page=limit)
+    after = request.GET.get('after')
+    # page() falls back to the first page, which would send a client following `next` round again
+    if after and paginator.parse(after) is None:
+        return _error(400, 'Invalid cursor.')
+    page = paginator.page(after=after)
+    response = JsonResponse({
+        'results': [{name: row[FIELDS[name]] for name in names} for row in page.items],
+        'next': page.next_cursor,
+    })
+    response['X-Changes-Cursor'] = str(cursor)
+    return response
+
+
+@api_staff_required
+def record_changes(request):
+    if request.method != 'GET':
+        response = _error(405, 'Method not allowed.')
+        response['Allow'] = 'GET'
+        return response
+    names = _fields(request)
+    if isinstance(names, JsonResponse):
+        return names
+    try:
+        since = int(request.GET.get('since', 0))
+    except ValueError:
+        since = -1
+    if since < 0:
+        return _error(400, 'since must be a cursor from X-Changes-Cursor or a change event.')
+    horizon = changes.horizon()
+    if since < horizon:
+        return _error(410, 'Cursor predates the compacted change log; resync from manage/api/records.', horizon=horizon)
+
+    # stop at the head as of now, so the stream ends even while writes continue
+    head = changes.head()
+    response = StreamingHttpResponse(_stream_changes(since, head, names), content_type='application/x-ndjson')
+    response['X-Changes-Cursor'] = str(max(since, head))
+    return response
+
+
+def _stream_changes(since, head, names):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    lookups = {FIELDS[name] for name in names} | {'id'}
+    chunk = settings.RECORDS_API_MAX_PAGE_SIZE
+    while since < head:
+        events = list(
+            RecordChange.objects.filter(id__gt=since, id__lte=head).values_list('id', 'op', 'record_id')[:chunk]
+        )
+        if not events:
+            break
+        live = {pk for _, op, pk in events if op != changes.DELETE}
+        rows = {row['id']: row for row in Record.objects.filter(pk__in=live).values(*lookups)}
+        for cursor, op, pk in events:
+            record = None
+            if op != changes.DELETE:
+                if pk not in rows:
+                    # deleted since; its delete event follows
+                    continue
+                record = {name: rows[pk][FIELDS[name]] for name in names}
+            yield encoder.encode({'cursor': cursor, 'op': op, 'id': pk, 'record': record}) + '\n'
+        since = events[-1][0]
+
+
+def _batch(request):
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError as exc:
+        return _error(400, f'Invalid JSON: {exc}')
+    if not isinstance(payload, dict):
+        return _error(400, 'Expected an object with "create", "update" and/or "delete" lists.')
+    creates, updates, deletes = (payload.get(op) or [] for op in ('create', 'update', 'delete'))
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        return _error(400, '"create", "update" and "delete" must be lists.')
+    size = len(creates) + len(updates) + len(deletes)
+    if size > settings.RECORDS_API_MAX_BATCH:
+        return _error(413, f'At most {settings.RECORDS_API_MAX_BATCH} operations per request.')
+
+    errors = []
+    new_records = []
+    for index, item in enumerate(creates):
+        record, problems = _validated(Record(created_by=request.user), item)
+        if problems:
+            errors.append({'op': 'create', 'index': index, 'errors': problems})
+        else:
+            new_records.append(record)
+
+    ids = [item.get('id') for item in updates if isinstance(item, dict)] + list(deletes)
+    existing = Record.objects.in_bulk({pk for pk in ids if _is_id(pk)})
+    now = timezone.now()
+    changed = []
+    seen = set()
+    for index, item in enumerate(updates):
+        pk = item.get('id') if isinstance(item, dict) else None
+        problem = _id_problem(pk, existing)
+        if problem is None and pk in seen:
+            problem = 'Updated more than once in this batch.'
+        if problem is not None:
+            errors.append({'op': 'update', 'index': index, 'id': pk, 'errors': {'id': [problem]}})
+            continue
+        seen.add(pk)
+        record, problems = _validated(existing[pk], item)
+        if problems:
+            errors.append({'op': 'update', 'index': index, 'id': pk, 'errors': problems})
+        else:
+            # only what the client sent: apply() writes it over the row as it is then
+            changed.append((pk, {name: getattr(record, name) for name in EDITABLE if name in item}))
+    for index, pk in enumerate(deletes):
+        problem = _id_problem(pk, existing)
+        if problem is not None:
+            errors.append({'op': 'delete', 'index': index, 'id': pk, 'errors': {'id': [problem]}})
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    # a record listed twice is deleted (and reported) once
+    doomed = list(dict.fromkeys(deletes))
+
+    def apply():
+        # one transaction (see retry_on_locked), one counter write and one change-log
+        # insert however big the batch
+        with counters.batched(), changes.batched():
+            Record.objects.bulk_create(new_records, batch_size=500)
+            # bulk_create and bulk_update skip post_save: count and log the rows here
+            counters.bump(counters.TOTAL_RECORDS, len(new_records))
+            changes.log(changes.CREATE, [record.pk for record in new_records])
+            updated = _update(changed, now)
+            changes.log(changes.UPDATE, updated)
+            if not doomed:
+                return updated, []
+            # report what this transaction removed, not what was asked for: another
+            # writer may have got to some of them first
+            removed = set(Record.objects.filter(pk__in=doomed).values_list('pk', flat=True))
+            Record.objects.filter(pk__in=removed).delete()
+            return updated, [pk for pk in doomed if pk in removed]
+
+    updated, deleted = retry_on_locked(apply)()
+    return JsonResponse({
+        'created': [record.pk for record in new_records],
+        'updated': updated,
+        'deleted': deleted,
+    })
+
+
+def _update(changed, now):
+    """
+    Write each ``(pk, values)`` over its row as read inside the current transaction,
+    so fields a client didn't send keep any concurrent edit. Returns the ids that
+    still existed.
+    """
+    if not changed:
+        return []
+    current = Record.objects.select_for_update().in_bulk([pk for pk, _ in changed])
+    by_fields = defaultdict(list)
+    for pk, values in changed:
+        record = current.get(pk)
+        if record is None:
+            continue
+        for name, value in values.items():
+            setattr(record, name, value)
+        record.updated_at = now  # bulk_update skips auto_now
+        by_fields[tuple(values)].append(record)
+    for fields, records in by_fields.items():
+        Record.objects.bulk_update(records, [*fields, 'updated_at'], batch_size=500)
+    return [pk for pk, _ in changed if pk in current]
+
+
+def _is_id(pk):
+    # not isinstance(): True and False are ints too, and would address pk 1 and 0
+    return type(pk) is int
+
+
+def _id_problem(pk, existing):
+    if not _is_id(pk):
+        return 'Expected an integer record id.'
+    if pk not in existing:
+        return 'No such record.'
+    return None
+
+
+def _validated(record, item):
+    """Apply ``item`` over ``record`` through RecordForm's rules; returns (record, errors)."""
+    if not isinstance(item, dict):
+        return record, {'__all__': ['Expected an object.']}
+    data = {name: item.get(name, getattr(record, name)) for name in EDITABLE}
+    form = RecordForm(data, instance=record)
+    if not form.is_valid():
+        return record, {field: list(messages) for field, messages in form.errors.items()}
+    return form.save(commit=False), None
@@ -0,0 +1,187 @@
+"""
+Async variants of the busiest read-only pages and the live records stream,
+routed instead of their views.py twins when settings.ASYNC_VIEWS is on (the
+default under CRUDApp/asgi.py).
+
+Independent ORM reads run at the same time on a small pool of read threads,
+each with its own database connection, rather than one after another on the
+single thread Django's own async ORM wrappers queue onto.
+
+The pool is bounded (ASYNC_READ_THREADS) and its threads keep their connection
+between reads: reconnecting per read would cost a connect plus, under
+DJANGO_SQLITE_PROFILE=production, six PRAGMAs every time (`manage.py benchmark
+reads` measures both). A connection is still dropped after an error that left
+it unusable, and recycled after CONN_MAX_AGE when that is set; CONN_MAX_AGE=0
+("close after each request") doesn't apply to threads that outlive requests.
+The price is up to ASYNC_READ_THREADS idle connections per process.
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db import connections
+from django.conf import settings
+from django.http import Http404, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.utils import timezone
+
+from . import activity, changes, live, pagecache
+from .conditional import not_modified, set_validators
+from .counters import site_stats
+from .models import Record
+from .views import dashboard_context, home_context, record_etag, trend_days
+
+
+_pool = None
+
+
+def _read_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=settings.ASYNC_READ_THREADS, thread_name_prefix='async-read')
+    return _pool
+
+
+def _release_connections():
+    # close_old_connections() minus the CONN_MAX_AGE=0 rule: pool threads never see
+    # request_finished, and closing after every read would reconnect on the next one
+    for conn in connections.all(initialized_only=True):
+        if not conn.settings_dict['CONN_MAX_AGE']:
+            conn.close_at = None
+        conn.close_if_unusable_or_obsolete()
+
+
+def _read(func):
+    def run():
+        try:
+            return func()
+        finally:
+            _release_connections()
+    return sync_to_async(run, thread_sensitive=False, executor=_read_pool())()
+
+
+async def gather_reads(*funcs):
+    return await asyncio.gather(*(_read(func) for func in funcs))
+
+
+async def _load_user(request):
+    # request.user is lazy and hits the session and auth tables; resolve it off the loop
+    # so templates (navbar, context processors) can read it without touching the DB
+    def load():
+        request.user.is_authenticated
+        return request.user
+    return await sync_to_async(load)()
+
+
+@pagecache.anonymous
+async def home(request):
+    _, (stats, recent_records) = await asyncio.gather(
+        _load_user(request),
+        gather_reads(site_stats, lambda: list(Record.objects.select_related('created_by')[:6])),
+    )
+    return render(request, 'pages/index.html', home_context(stats, recent_records))
+
+
+async def dashboard(request):
+    user = await _load_user(request)
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), 'login')
+    now = timezone.now()
+    days = trend_days(request)
+    reads = [lambda: site_stats(now), lambda: activity.trend(days)]
+    if user.is_staff:
+        reads.append(lambda: list(Record.objects.select_related('created_by')[:5]))
+    site, trend, *latest = await gather_reads(*reads)
+    context = dashboard_context(request, now, site, latest[0] if latest else [], trend)
+    return render(request, 'pages/dashboard.html', context)
+
+
+async def record_detail(request, pk: int):
+    user = await _load_user(request)
+    if not (user.is_active and user.is_staff):
+        return redirect_to_login(request.get_full_path(), 'login')
+    response = await _record_detail(request, pk)
+    # Django 4.2's cache_control decorator can't wrap a coroutine
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+async def _record_detail(request, pk):
+    (record,) = await gather_reads(lambda: Record.objects.select_related('created_by').filter(pk=pk).first())
+    if record is None:
+        raise Http404('No Record matches the given query.')
+    etag = record_etag(request, record)
+    # checking for flash messages may load the session
+    response = await sync_to_async(not_modified)(request, etag, record.updated_at)
+    if response is not None:
+        return response
+    response = render(request, 'pages/record_detail.html', {"record": record})
+    return set_validators(request, response, etag, record.updated_at)
+
+
+# a reconnecting stream catches up from the change log, up to this many events;
+# further behind, the page reloads instead
+REPLAY_LIMIT = 500
+# how long EventSource waits before reconnecting
+RETRY_MS = 2000
+
+
+async def record_events(request):
+    """
+    Server-sent events for the records workspace: one ``record`` event per
+    committed change, ``id`` being its change-log cursor.
+
+    Django 4.2 doesn't tell a streaming view that its client went away, so a
+    stream ends after LIVE_EVENTS_MAX_AGE seconds and EventSource reconnects
+    (with Last-Event-ID, so nothing is missed) rather than living forever.
+    """
+    user = await _load_user(request)
+    if not (user.is_active and user.is_staff):
+        return HttpResponseForbidden('Forbidden', content_type='text/plain')
+    try:
+        last = int(request.headers['Last-Event-ID'])
+    except (KeyError, ValueError):
+        last = None
+    response = StreamingHttpResponse(_event_stream(last), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx would otherwise buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _sse(event):
+    return f"id: {event['cursor']}\nevent: record\ndata: {json.dumps({'op': event['op'], 'id': event['id']})}\n\n"
+
+
+async def _event_stream(last):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.LIVE_EVENTS_MAX_AGE
+    # subscribe before reading the backlog so nothing falls between the two
+    with live.broker().subscribe() as subscription:
+        yield f'retry: {RETRY_MS}\n\n'
+        if last is not None:
+            (backlog,) = await gather_reads(lambda: changes.events_after(last, REPLAY_LIMIT))
+            if backlog is None:
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            for event in backlog:
+                yield _sse(event)
+                last = event['cursor']
+
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(subscription.get(), min(settings.LIVE_EVENTS_HEARTBEAT, remaining))
+            except asyncio.TimeoutError:
+                # keeps proxies from timing the connection out
+                yield ': ping\n\n'
+                continue
+            if last is not None and event['cursor'] <= last:
+                continue
+            last = event['cursor']
+            yield _sse(event)
+            if subscription.overflowed and subscription.queue.empty():
+                # events were dropped: end here, the reconnect replays them from the log
+                return
@@ -0,0 +1,72 @@
+"""
+Per-user cache in front of ``django.contrib.auth.get_user``.
+
+The session still names the user and carries its auth hash; only the
+``auth_user`` row comes from the cache. Every save or delete of a user drops
+its entry (see signals.py), as must any code that changes users with
+``QuerySet.update()``. With several worker processes the default cache has to
+be shared (DJANGO_CACHE_BACKEND), or other workers keep the old row for up to
+AUTH_USER_CACHE_TIMEOUT seconds.
+
+``authenticate_basic`` does the same for HTTP Basic credentials (the records
+API), whose password check would otherwise run the full PBKDF2 hash on every
+request. A success is remembered under an HMAC of the credentials, never the
+password itself, and only holds while the user's entry is cached, so
+``forget_users`` ends it as well.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+
+def _key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _credentials_key(username, password):
+    digest = salted_hmac('website.auth.basic', f'{username}:{password}', algorithm='sha256').hexdigest()
+    return f'auth:basic:{digest}'
+
+
+def get_user(request):
+    timeout = settings.AUTH_USER_CACHE_TIMEOUT
+    user_id = request.session.get(auth.SESSION_KEY)
+    if not timeout or user_id is None:
+        return auth.get_user(request)
+
+    user = cache.get(_key(user_id))
+    if user is not None:
+        session_hash = request.session.get(auth.HASH_SESSION_KEY)
+        if session_hash and constant_time_compare(session_hash, user.get_session_auth_hash()):
+            return user
+        # let Django handle fallback secrets and flushing stale sessions
+        return auth.get_user(request)
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(_key(user.pk), user, timeout)
+    return user
+
+
+def authenticate_basic(request, username, password):
+    timeout = settings.AUTH_USER_CACHE_TIMEOUT
+    if not timeout:
+        return auth.authenticate(request, username=username, password=password)
+
+    key = _credentials_key(username, password)
+    user_id, password_hash = cache.get(key, (None, None))
+    if user_id is not None:
+        user = cache.get(_key(user_id))
+        # a rename or password change since then must not let the old credentials in
+        if user is not None and user.get_username() == username and constant_time_compare(user.password, password_hash):
+            return user
+
+    user = auth.authenticate(request, username=username, password=password)
+    if user is not None:
+        cache.set_many({_key(user.pk): user, key: (user.pk, user.password)}, timeout)
+    return user
+
+
+def forget_users(*user_ids):
+    cache.delete_many([_key(user_id) for user_id in user_ids])
@@ -0,0 +1,535 @@
+"""
+Benchmark suites run by ``manage.py benchmark <suite>``.
+
+Suites registered with ``isolated=True`` run against a throwaway database built
+the same way the test runner builds one, so seeding never touches real data.
+"""
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Q
+from django.template import engines
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import activity, async_views, compression, counters
+from .models import Record
+from .search import fts_available, search_records
+from .sqlite import retry_on_locked
+
+SUITES = {}
+
+WORDS = [
+    'launch', 'plan', 'archive', 'budget', 'roadmap', 'invoice', 'contract', 'review', 'design',
+    'release', 'sprint', 'audit', 'vendor', 'support', 'incident', 'report', 'forecast', 'hiring',
+    'migration', 'backup', 'security', 'pricing', 'customer', 'partner', 'onboarding', 'renewal',
+    'quarterly', 'summary', 'draft', 'approval', 'meeting', 'notes', 'feedback', 'analytics',
+    'mobile', 'billing', 'compliance', 'training', 'research', 'prototype', 'inventory', 'shipping',
+]
+
+
+def suite(name, isolated=True):
+    def register(func):
+        SUITES[name] = (func, isolated)
+        return func
+    return register
+
+
+@contextlib.contextmanager
+def isolated_database(db_file=None):
+    """Create a fresh, migrated copy of the default database and drop it afterwards."""
+    if db_file:
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = db_file
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed(records, users=None, batch_size=5000, rng=None):
+    """
+    Bulk-insert ``records`` records spread over ``users`` new owners (default: one per
+    10 records). Calling it again adds to what is already there.
+    """
+    rng = rng or random.Random(1234)
+    users = users or max(1, records // 10)
+    offset = User.objects.filter(username__startswith='seed').count()
+    now = timezone.now()
+    new_users = []
+    for i in range(offset, offset + users):
+        joined = now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+        seen = joined + (now - joined) * rng.random() if rng.random() < 0.6 else None
+        new_users.append(User(
+            username=f'seed{i}', email=f'seed{i}@example.com', password='!',
+            date_joined=joined, last_login=seen,
+        ))
+    User.objects.bulk_create(new_users, batch_size=batch_size)
+    owner_ids = list(User.objects.filter(username__startswith='seed').values_list('id', flat=True))
+    for start in range(0, records, batch_size):
+        Record.objects.bulk_create(
+            Record(
+                title=' '.join(rng.choices(WORDS, k=3)).capitalize(),
+                description=' '.join(rng.choices(WORDS, k=24)),
+                created_by_id=rng.choice(owner_ids),
+            )
+            for _ in range(start, min(records, start + batch_size))
+        )
+    # bulk_create skips the signals that maintain the counters
+    counters.rebuild()
+    return owner_ids
+
+
+def staff_client():
+    """A test client logged in as a superuser; 'localhost' passes the default ALLOWED_HOSTS."""
+    admin, _ = User.objects.get_or_create(
+        username='bench-admin', defaults={'is_staff': True, 'is_superuser': True}
+    )
+    client = Client(SERVER_NAME='localhost')
+    client.force_login(admin)
+    return client
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples_ms):
+    ordered = sorted(samples_ms)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))], 3)
+
+    return {
+        'samples': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered), 3),
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+    }
+
+
+@suite('search')
+def search_suite(options):
+    """Compare the records_list search (first page + match count) with and without FTS."""
+    seed(options['records'])
+    terms = options.get('terms') or ['launch', 'budget review', 'seed4', 'qua', 'nomatch']
+    base = Record.objects.select_related('created_by')
+
+    def legacy(term):
+        qs = base.filter(
+            Q(title__icontains=term)
+            | Q(description__icontains=term)
+            | Q(created_by__username__icontains=term)
+        )
+        list(qs.order_by('-created_at', '-id')[:24])
+        qs.count()
+
+    def fts(term):
+        qs, ordering = search_records(base, term)
+        list(qs.order_by(*ordering)[:24])
+        qs.count()
+
+    results = {}
+    for term in terms:
+        results[f'icontains {term!r}'] = timed(lambda: legacy(term), options['repeat'])
+        if fts_available():
+            results[f'fts5 {term!r}'] = timed(lambda: fts(term), options['repeat'])
+    return results
+
+
+@suite('cards')
+def cards_suite(options):
+    """Render the records_list card grid uncached, cold, and with a warm fragment cache."""
+    seed(options['records'])
+    records = list(Record.objects.select_related('created_by')[:1000])
+    grid = engines['django'].from_string(
+        "{% for r in records %}{% include 'components/record_card.html' with record=r %}{% endfor %}"
+    )
+
+    def render():
+        grid.render({'records': records})
+
+    results = {}
+    with override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'fragments': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    }):
+        results[f'{len(records)} cards, no cache'] = timed(render, options['repeat'])
+
+    fragments = caches['fragments']
+    fragments.clear()
+    results[f'{len(records)} cards, cold cache'] = timed(render, 1)
+    results[f'{len(records)} cards, warm cache'] = timed(render, options['repeat'])
+    return results
+
+
+@suite('icons')
+def icons_suite(options):
+    """HTML size and latency of the icon-heavy pages in each UI_ICONS_SPRITE mode."""
+    seed(options['records'])
+    client = staff_client()
+    results = {}
+    for mode in ('', 'inline', 'external'):
+        with override_settings(UI_ICONS_SPRITE=mode):
+            caches['fragments'].clear()
+            for name in ('records_list', 'dashboard'):
+                url = reverse(name)
+                size = len(client.get(url).content)
+                stats = timed(lambda: client.get(url), options['repeat'])
+                results[f'{name} [{mode or "svg"}]'] = {'bytes': size, **stats}
+    return results
+
+
+@suite('auth')
+def auth_suite(options):
+    """Queries and latency of a logged-in dashboard request per session engine and user cache."""
+    seed(options['records'])
+    url = reverse('dashboard')
+    results = {}
+    for engine in ('db', 'cached_db', 'signed_cookies'):
+        for user_cache in (0, 60):
+            with override_settings(
+                SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}',
+                AUTH_USER_CACHE_TIMEOUT=user_cache,
+            ):
+                caches['default'].clear()
+                client = staff_client()
+                client.get(url)
+                with CaptureQueriesContext(connection) as ctx:
+                    client.get(url)
+                queries = len(ctx.captured_queries)
+                stats = timed(lambda: client.get(url), options['repeat'])
+            results[f"{engine} sessions, user cache {'on' if user_cache else 'off'}"] = {'queries': queries, **stats}
+    return results
+
+
+@suite('compression')
+def compression_suite(options):
+    """
+    Bytes on the wire and latency of the heaviest pages with raw and compacted
+    templates, uncompressed and in each supported coding; compress_ms is the
+    CPU spent compressing one response on its own.
+    """
+    seed(options['records'])
+    client = staff_client()
+    loader = engines['django'].engine.template_loaders[0]
+    results = {}
+    for compact in (False, True):
+        with override_settings(COMPACT_TEMPLATES=compact):
+            loader.reset()
+            caches['fragments'].clear()
+            for name in ('home', 'records_list', 'dashboard', 'admin_users'):
+                url = reverse(name)
+                body = client.get(url).content
+                for coding in (None, *compression.encodings()):
+                    headers = {'HTTP_ACCEPT_ENCODING': coding} if coding else {}
+                    size = len(client.get(url, **headers).content)
+                    stats = timed(lambda: client.get(url, **headers), options['repeat'])
+                    cpu = timed(lambda: compression.compress(body, coding), options['repeat']) if coding else None
+                    results[f"{name} [{'compact' if compact else 'raw'}, {coding or 'identity'}]"] = {
+                        'bytes': size,
+                        'compress_ms': cpu['p50_ms'] if cpu else 0,
+                        **stats,
+                    }
+    loader.reset()
+    return results
+
+
+# never finish (event streams) or change the benchmark's own session in ways a GET can't undo
+SKIP_ROUTES = {'record_events'}
+
+
+def route_urls():
+    """(name, url) for every named route in website/urls.py, with ids of seeded rows."""
+    from . import urls
+
+    record_id = Record.objects.values_list('pk', flat=True).first()
+    user_id = User.objects.filter(username__startswith='seed').values_list('pk', flat=True).first()
+    ids = {'pk': record_id, 'user_id': user_id}
+    for pattern in urls.urlpatterns:
+        name = pattern.name
+        if not name or name in SKIP_ROUTES:
+            continue
+        kwargs = {key: ids[key] for key in pattern.pattern.converters}
+        yield name, reverse(name, kwargs=kwargs)
+
+
+def _fetch(client, url):
+    response = client.get(url)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+@suite('views')
+def views_suite(options):
+    """
+    Seed each size in turn (sizes grow incrementally) and GET every route as a
+    superuser: latency percentiles, queries per request and peak traced memory.
+    """
+    results = {}
+    seeded = 0
+    for size in options['sizes']:
+        seed(size - seeded)
+        seeded = size
+        client = staff_client()
+        for name, url in route_urls():
+            if name == 'logout':
+                # logging out ends the session: use a client of its own (the re-login is timed too)
+                def request(client=staff_client(), url=url):
+                    client.force_login(User.objects.get(username='bench-admin'))
+                    return _fetch(client, url)
+            else:
+                def request(client=client, url=url):
+                    return _fetch(client, url)
+
+            request()  # warm caches, like a steady-state worker
+            stats = timed(request, options['repeat'])
+            with CaptureQueriesContext(connection) as ctx:
+                status = request().status_code
+            # read now: the next request resets the connection's query log
+            queries = len(ctx.captured_queries)
+            tracemalloc.start()
+            try:
+                request()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            results[f'{size} {name}'] = {
+                'status': status,
+                'queries': queries,
+                'peak_kb': round(peak / 1024, 1),
+                **stats,
+            }
+    return results
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection') != 'close'
+
+
+async def _load_client(target, paths, cookie, deadline, samples, errors):
+    """One keep-alive HTTP/1.1 connection issuing requests back to back until ``deadline``."""
+    host, port = target.hostname, target.port or 80
+    requests = [
+        (
+            f'GET {target.path.rstrip("/")}{path} HTTP/1.1\r\nHost: {target.netloc}\r\n'
+            + (f'Cookie: {cookie}\r\n' if cookie else '')
+            + 'Connection: keep-alive\r\n\r\n'
+        ).encode()
+        for path in paths
+    ]
+    writer = None
+    sent = 0
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write(requests[sent % len(requests)])
+            sent += 1
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+            samples.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as exc:
+            errors.append(type(exc).__name__)
+            if writer is not None:
+                writer.close()
+                writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def _load(target, paths, cookie, clients, duration):
+    samples, errors = [], []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _load_client(target, paths, cookie, deadline, samples, errors) for _ in range(clients)
+    ))
+    return samples, errors, time.perf_counter() - started
+
+
+@suite('reads')
+def reads_suite(options):
+    """
+    The staff dashboard's concurrent reads through async_views.gather_reads(), on read
+    threads that keep their connection and reconnecting for every read, per SQLite
+    profile. Use --db-file: an in-memory database never really closes.
+    """
+    seed(options['records'])
+    reads = [
+        counters.site_stats,
+        lambda: activity.trend(30),
+        lambda: list(Record.objects.select_related('created_by')[:5]),
+    ]
+
+    def reconnecting(func):
+        def read():
+            try:
+                return func()
+            finally:
+                connections.close_all()
+        return read
+
+    results = {}
+    for profile in ('', 'production'):
+        with override_settings(SQLITE_PROFILE=profile):
+            for label, funcs in (('kept', reads), ('per read', [reconnecting(func) for func in reads])):
+                connections.close_all()
+
+                def run():
+                    asyncio.run(async_views.gather_reads(*funcs))
+                run()
+                results[f"{profile or 'default'} profile, connection {label}"] = timed(run, options['repeat'])
+    return results
+
+
+@suite('load', isolated=False)
+def load_suite(options):
+    """
+    Drive already-running servers (e.g. gunicorn on WSGI and uvicorn on ASGI) with N
+    concurrent keep-alive clients each and report requests/sec and latency percentiles.
+    """
+    targets = options.get('target') or ['http://127.0.0.1:8000']
+    paths = options.get('paths') or ['/']
+    results = {}
+    for spec in targets:
+        label, _, url = spec.rpartition('=')
+        target = urlsplit(url)
+        if target.scheme != 'http':
+            raise CommandError(f'{url}: only plain http:// targets are supported.')
+        for clients in options['concurrency']:
+            samples, errors, elapsed = asyncio.run(
+                _load(target, paths, options.get('cookie'), clients, options['duration'])
+            )
+            stats = summarize(samples) if samples else {'samples': 0}
+            results[f'{label or url} c={clients}'] = {
+                'rps': round(len(samples) / elapsed, 1),
+                'errors': len(errors),
+                **stats,
+            }
+    return results
+
+
+def _contention_worker(role, profile, deadline, results):
+    """Child process: read or write against the shared database file until ``deadline``."""
+    samples, errors = [], 0
+    rng = random.Random(os.getpid())
+    with override_settings(SQLITE_PROFILE=profile):
+        owner_ids = list(User.objects.filter(username__startswith='seed').values_list('id', flat=True)[:100])
+
+        def write():
+            return Record.objects.create(
+                title=' '.join(rng.choices(WORDS, k=3)).capitalize(),
+                description=' '.join(rng.choices(WORDS, k=24)),
+                created_by_id=rng.choice(owner_ids),
+            )
+
+        def read():
+            list(Record.objects.select_related('created_by')[:24])
+            Record.objects.filter(created_by_id=rng.choice(owner_ids)).count()
+
+        if role == 'writer':
+            # the production profile is what the views do: one IMMEDIATE transaction, retried
+            op = retry_on_locked(write) if profile == 'production' else write
+        else:
+            op = read
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                op()
+            except OperationalError:
+                errors += 1
+                continue
+            samples.append((time.perf_counter() - started) * 1000)
+        connection.close()
+    results.put((role, samples, errors))
+
+
+@suite('contention', isolated=False)
+def contention_suite(options):
+    """
+    Readers and writers in separate processes against one SQLite file, first with the
+    default rollback journal, then with DJANGO_SQLITE_PROFILE=production (WAL et al.).
+    """
+    db_file = options['db_file'] or os.path.join(tempfile.mkdtemp(), 'contention.sqlite3')
+    context = multiprocessing.get_context('fork')
+    results = {}
+    with isolated_database(db_file):
+        seed(options['records'])
+        for profile in ('', 'production'):
+            with override_settings(SQLITE_PROFILE=profile):
+                connection.close()
+                with connection.cursor() as cursor:
+                    # the journal mode sticks to the file, so switch it back explicitly
+                    cursor.execute(f"PRAGMA journal_mode = {'WAL' if profile else 'DELETE'}")
+                connections.close_all()
+            queue = context.Queue()
+            deadline = time.time() + options['duration']
+            roles = ['writer'] * options['writers'] + ['reader'] * options['readers']
+            workers = [context.Process(target=_contention_worker, args=(role, profile, deadline, queue)) for role in roles]
+            for worker in workers:
+                worker.start()
+            collected = {'writer': ([], 0), 'reader': ([], 0)}
+            for _ in workers:
+                role, samples, errors = queue.get()
+                collected[role] = (collected[role][0] + samples, collected[role][1] + errors)
+            for worker in workers:
+                worker.join()
+            for role, (samples, errors) in collected.items():
+                stats = summarize(samples) if samples else {'samples': 0}
+                results[f"{profile or 'default'} {role}s"] = {
+                    'ops_per_s': round(len(samples) / options['duration'], 1),
+                    'errors': errors,
+                    **stats,
+                }
+    return results
@@ -0,0 +1,104 @@
+"""
+Append-only change log for records, read through ``manage/api/records/changes``.
+
+Every create, update and delete of a record appends a ``RecordChange`` row;
+signals cover save() and delete(), the bulk paths (records API, import_records)
+call ``log()`` themselves. Once committed, entries are also pushed to open
+records pages (website/live.py). The row id is the consumer's cursor. SQLite
+commits one writer at a time, so ids become visible in order and a consumer
+resuming after its last id never skips an event.
+
+``compact()`` keeps the log proportional to recent change volume: only the
+newest event per record is kept (the feed serves current rows, so older ones
+add nothing), and events past the retention window are dropped. Cursors older
+than the dropped range are refused with 410 and must resync from the list.
+"""
+import contextlib
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import activity, live, pagecache
+from .models import Counter, RecordChange
+
+CREATE, UPDATE, DELETE = RecordChange.CREATE, RecordChange.UPDATE, RecordChange.DELETE
+
+# cursors below this were compacted away
+HORIZON = 'changes.horizon'
+
+# [RecordChange] while inside batched()
+_pending = ContextVar('pending_record_changes', default=None)
+
+
+def log(op, record_ids):
+    events = [RecordChange(record_id=pk, op=op) for pk in record_ids]
+    pending = _pending.get()
+    if pending is not None:
+        pending.extend(events)
+    else:
+        _append(events)
+
+
+def _append(events):
+    if not events:
+        return
+    RecordChange.objects.bulk_create(events, batch_size=500)
+    # open records pages hear about it once it is visible to their follow-up reads;
+    # a broker outage must not fail a write that has already committed
+    payload = [{'cursor': e.pk, 'op': e.op, 'id': e.record_id} for e in events]
+    transaction.on_commit(lambda: live.publish(payload), robust=True)
+    activity.schedule_refresh()
+    if any(e.op != UPDATE for e in events):
+        # the home page lists the newest records and counts them
+        transaction.on_commit(pagecache.invalidate, robust=True)
+
+
+@contextlib.contextmanager
+def batched():
+    """Collect log() calls made inside the block and insert them in one go when it exits without an error."""
+    if _pending.get() is not None:
+        yield
+        return
+    pending = []
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    _append(pending)
+
+
+def head():
+    """The newest cursor, or 0 when the log is empty."""
+    return RecordChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def events_after(cursor, limit):
+    """Up to ``limit`` events after ``cursor`` as dicts, or None if the log can't say (compacted, or more than that)."""
+    if cursor < horizon():
+        return None
+    rows = list(RecordChange.objects.filter(id__gt=cursor).values_list('id', 'op', 'record_id')[:limit + 1])
+    if len(rows) > limit:
+        return None
+    return [{'cursor': pk, 'op': op, 'id': record_id} for pk, op, record_id in rows]
+
+
+def horizon():
+    return Counter.objects.filter(key=HORIZON).values_list('value', flat=True).first() or 0
+
+
+def compact(retention, now=None):
+    """Drop superseded events, then events older than ``retention``. Returns (superseded, expired)."""
+    newer = RecordChange.objects.filter(record_id=OuterRef('record_id'), id__gt=OuterRef('id'))
+    superseded, _ = RecordChange.objects.filter(Exists(newer)).delete()
+
+    cutoff = (now or timezone.now()) - retention
+    # ids grow with time: walk back from the newest event to the last one past the window
+    last_expired = RecordChange.objects.filter(at__lt=cutoff).order_by('-id').values_list('id', flat=True).first()
+    if last_expired is None:
+        return superseded, 0
+    expired, _ = RecordChange.objects.filter(id__lte=last_expired).delete()
+    Counter.objects.update_or_create(key=HORIZON, defaults={'value': max(last_expired, horizon())})
+    return superseded, expired
@@ -0,0 +1,113 @@
+"""
+gzip/brotli encoding shared by CompressionMiddleware and the static pipeline.
+
+gzip is always available; brotli (``br``) only when the ``brotli`` package is
+installed, and is preferred when the client accepts both. Responses are
+compressed on the fly at a moderate level; files compressed once ahead of time
+can afford the slowest, smallest settings (``best=True``).
+
+On-the-fly gzip output carries a random-length filename in its header, as
+Django's GZipMiddleware does, so compressed sizes don't leak page secrets
+(BREACH).
+CSRF tokens are masked per response, which covers brotli as well.
+"""
+import gzip
+import io
+import re
+import secrets
+import string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+MAX_RANDOM_BYTES = 100
+
+_coding = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*')
+
+
+def encodings():
+    """Supported content codings, most preferred first."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding, codings=None):
+    """The best of ``codings`` (default: all supported) in an Accept-Encoding header, or None for identity."""
+    weights = {}
+    for item in accept_encoding.split(','):
+        match = _coding.fullmatch(item)
+        if not match:
+            continue
+        try:
+            weights[match.group(1).lower()] = float(match.group(2) or 1)
+        except ValueError:
+            continue
+    best, best_q = None, 0
+    for coding in encodings() if codings is None else codings:
+        q = weights.get(coding, weights.get('*', 0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class Stream:
+    """Incremental compressor: feed chunks to ``process()``, then call ``finish()`` once."""
+
+    def __init__(self, coding, best=False):
+        self.coding = coding
+        if coding == 'br':
+            self._br = brotli.Compressor(quality=11 if best else BROTLI_QUALITY)
+            return
+        self._buffer = io.BytesIO()
+        # files compressed ahead of time hold no secrets: no padding for them
+        filename = '' if best else ''.join(
+            secrets.choice(string.ascii_letters) for _ in range(secrets.randbelow(MAX_RANDOM_BYTES))
+        )
+        self._gzip = gzip.GzipFile(
+            filename=filename, mode='wb', compresslevel=9 if best else GZIP_LEVEL,
+            fileobj=self._buffer, mtime=0,
+        )
+
+    def process(self, chunk):
+        if self.coding == 'br':
+            return self._br.process(chunk)
+        self._gzip.write(chunk)
+        return self._drain()
+
+    def finish(self):
+        if self.coding == 'br':
+            return self._br.finish()
+        self._gzip.close()
+        return self._drain()
+
+    def _drain(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def compress(data, coding, best=False):
+    stream = Stream(coding, best=best)
+    return stream.process(data) + stream.finish()
+
+
+def compress_chunks(chunks, coding):
+    stream = Stream(coding)
+    for chunk in chunks:
+        data = stream.process(chunk)
+        if data:
+            yield data
+    yield stream.finish()
+
+
+async def acompress_chunks(chunks, coding):
+    stream = Stream(coding)
+    async for chunk in chunks:
+        data = stream.process(chunk)
+        if data:
+            yield data
+    yield stream.finish()
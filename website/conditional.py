@@ -0,0 +1,57 @@
+"""
+ETag / Last-Modified validators for the record pages.
+
+A validator covers everything the page shows: the data (a record's updated_at,
+or a max(updated_at) + count fingerprint of a list query), the viewer (navbar
+and staff links differ per user) and the templates themselves, so a deploy
+invalidates cached copies. Requests with flash messages waiting get no
+validators at all: the page has to render to show (and consume) them.
+"""
+import calendar
+import functools
+import hashlib
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / 'templates'
+
+
+@functools.lru_cache(maxsize=None)
+def templates_version():
+    digest = hashlib.sha1()
+    for path in sorted(TEMPLATES_DIR.rglob('*.html')):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:12]
+
+
+def has_pending_messages(request):
+    # len() loads the stored messages without marking them as shown
+    return bool(len(messages.get_messages(request)))
+
+
+def make_etag(request, *parts):
+    user = request.user
+    viewer = (user.pk, user.get_username(), user.is_staff, user.is_superuser)
+    raw = repr((parts, viewer, settings.UI_ICONS_SPRITE, templates_version()))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def not_modified(request, etag, last_modified):
+    """The 304/412 response for these validators, or None if the page must be rendered."""
+    if etag is None or has_pending_messages(request):
+        return None
+    timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+    return get_conditional_response(request, etag=quote_etag(etag), last_modified=timestamp)
+
+
+def set_validators(request, response, etag, last_modified):
+    if etag is None or request.method not in ('GET', 'HEAD') or has_pending_messages(request):
+        return response
+    response.headers.setdefault('ETag', quote_etag(etag))
+    if last_modified:
+        response.headers.setdefault('Last-Modified', http_date(calendar.timegm(last_modified.utctimetuple())))
+    return response
@@ -0,0 +1,128 @@
+"""
+O(1) site statistics backed by the ``Counter`` table.
+
+Totals live under fixed keys. Windowed stats ("joined in the last 7 days",
+"active in the last 24 hours") are hourly buckets keyed by the hour of each
+user's ``date_joined`` / ``last_login``: every user sits in exactly one bucket, so
+summing the buckets of a window counts each user once, to the hour. Signals in
+website/signals.py keep the rows current; ``manage.py reconcile_counters``
+rebuilds them from the source tables to repair drift from bulk operations.
+"""
+import contextlib
+from contextvars import ContextVar
+from datetime import timedelta, timezone as dt_timezone
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+TOTAL_USERS = 'users'
+TOTAL_RECORDS = 'records'
+USERS_JOINED = 'users.joined:'
+USERS_ACTIVE = 'users.active:'
+
+# buckets older than this are never read again and are dropped on reconcile
+RETENTION = timedelta(days=8)
+
+# {key: delta} while inside batched()
+_pending = ContextVar('pending_counter_bumps', default=None)
+
+
+def _counter_model():
+    return django_apps.get_model('website', 'Counter')
+
+
+def bucket(prefix, when):
+    return prefix + when.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H')
+
+
+def in_retention(when, now=None):
+    return when is not None and when >= (now or timezone.now()) - RETENTION
+
+
+def bump(key, delta=1):
+    if not delta:
+        return
+    pending = _pending.get()
+    if pending is not None:
+        pending[key] = pending.get(key, 0) + delta
+        return
+    Counter = _counter_model()
+    if Counter.objects.filter(key=key).update(value=F('value') + delta):
+        return
+    try:
+        with transaction.atomic():
+            Counter.objects.create(key=key, value=delta)
+    except IntegrityError:
+        # another writer created the row between our UPDATE and INSERT
+        Counter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+@contextlib.contextmanager
+def batched():
+    """
+    Collect bump() calls made inside the block (e.g. by the post_delete signals of a
+    bulk delete) and write each key once when it exits without an error.
+    """
+    if _pending.get() is not None:
+        yield
+        return
+    pending = {}
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    for key, delta in pending.items():
+        bump(key, delta)
+
+
+def value(key):
+    return _counter_model().objects.filter(key=key).values_list('value', flat=True).first() or 0
+
+
+def site_stats(now=None):
+    """Totals and 7d/24h user windows for the home page and dashboard, in one query."""
+    now = now or timezone.now()
+    joined = Q(key__gte=bucket(USERS_JOINED, now - timedelta(days=7)), key__lte=bucket(USERS_JOINED, now))
+    active = Q(key__gte=bucket(USERS_ACTIVE, now - timedelta(days=1)), key__lte=bucket(USERS_ACTIVE, now))
+    stats = _counter_model().objects.filter(Q(key__in=[TOTAL_USERS, TOTAL_RECORDS]) | joined | active).aggregate(
+        total_users=Sum('value', filter=Q(key=TOTAL_USERS)),
+        total_records=Sum('value', filter=Q(key=TOTAL_RECORDS)),
+        new_users_week=Sum('value', filter=joined),
+        active_24h=Sum('value', filter=active),
+    )
+    return {name: count or 0 for name, count in stats.items()}
+
+
+def rebuild(now=None):
+    """Recompute every counter from the source tables. Returns the new values."""
+    now = now or timezone.now()
+    since = now - RETENTION
+    User = django_apps.get_model(settings.AUTH_USER_MODEL)
+    Record = django_apps.get_model('website', 'Record')
+    Counter = _counter_model()
+
+    values = {TOTAL_USERS: User.objects.count(), TOTAL_RECORDS: Record.objects.count()}
+    for prefix, field in ((USERS_JOINED, 'date_joined'), (USERS_ACTIVE, 'last_login')):
+        hours = (
+            User.objects.filter(**{f'{field}__gte': since})
+            .annotate(hour=TruncHour(field, tzinfo=dt_timezone.utc))
+            .values('hour')
+            .annotate(n=Count('id'))
+            .values_list('hour', 'n')
+        )
+        for hour, n in hours:
+            values[bucket(prefix, hour)] = n
+
+    with transaction.atomic():
+        Counter.objects.filter(
+            Q(key__in=[TOTAL_USERS, TOTAL_RECORDS])
+            | Q(key__startswith=USERS_JOINED)
+            | Q(key__startswith=USERS_ACTIVE)
+        ).delete()
+        Counter.objects.bulk_create(Counter(key=key, value=n) for key, n in values.items())
+    return values
@@ -0,0 +1,166 @@
+"""
+Background jobs kept in the database, run by ``manage.py run_worker``.
+
+Views ``enqueue()`` a registered task and return at once. Workers claim jobs
+with a conditional UPDATE (queued, or running with an expired lease -> running
+under this worker), so any number of threads and processes can poll the same
+table without a broker and each job runs once per attempt. A task that raises
+is retried after an exponential backoff until ``max_attempts``; a worker that
+dies mid-job leaves its lease to expire, and the job is claimed again.
+
+Tasks must be safe to run again: a retry, or a lease that ran out under a
+slow task, repeats work that may already be partly done.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import changes, counters
+from .models import Job, Record
+from .sqlite import retry_on_locked
+
+logger = logging.getLogger(__name__)
+
+# candidates read per claim attempt; others may win some of them
+CLAIM_BATCH = 10
+
+tasks = {}
+
+
+def task(func):
+    """Register ``func`` as a job, by its name."""
+    tasks[func.__name__] = func
+    return func
+
+
+def enqueue(name, created_by=None, max_attempts=None, **args):
+    if name not in tasks:
+        raise LookupError(f'No task named {name!r}.')
+    job = Job(name=name, args=args, created_by=created_by)
+    if max_attempts is not None:
+        job.max_attempts = max_attempts
+    retry_on_locked(job.save)()
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def claim(worker, now=None):
+    """Take the next runnable job for ``worker``, or None."""
+    now = now or timezone.now()
+    ready = Q(status=Job.QUEUED, run_after__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+    candidates = Job.objects.filter(ready).order_by('run_after', 'id').values_list('pk', flat=True)
+    lease = now + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    for pk in candidates[:CLAIM_BATCH]:
+        claimed = retry_on_locked(Job.objects.filter(ready, pk=pk).update)(
+            status=Job.RUNNING, claimed_by=worker, locked_until=lease,
+            attempts=F('attempts') + 1, updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: doubling from JOBS_RETRY_BACKOFF, with jitter, capped at an hour."""
+    delay = min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1), 3600)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def run(job):
+    """Run a claimed job and record the outcome. Returns the job's new status."""
+    # only the worker holding the current claim may record the result
+    mine = Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by, attempts=job.attempts)
+    try:
+        func = tasks.get(job.name)
+        if job.attempts > job.max_attempts:
+            # claimed again after its leases ran out too often: the task keeps killing workers
+            raise RuntimeError('Lease expired on every attempt.')
+        if func is None:
+            raise LookupError(f'No task named {job.name!r}.')
+        result = func(**job.args)
+    except Exception as exc:
+        logger.exception('Job %s failed (attempt %s of %s)', job, job.attempts, job.max_attempts)
+        now = timezone.now()
+        error = f'{type(exc).__name__}: {exc}'
+        if job.attempts < job.max_attempts:
+            status, run_after = Job.QUEUED, now + timedelta(seconds=backoff(job.attempts))
+        else:
+            status, run_after = Job.FAILED, job.run_after
+        retry_on_locked(mine.update)(
+            status=status, run_after=run_after, error=error, locked_until=None, updated_at=now,
+        )
+        return status
+    retry_on_locked(mine.update)(
+        status=Job.DONE, result=result, error='', locked_until=None, updated_at=timezone.now(),
+    )
+    return Job.DONE
+
+
+def work(stop, poll=1.0, once=False):
+    """Claim and run jobs until ``stop`` is set (or, with ``once``, the queue is empty). Returns jobs run."""
+    name = worker_name()
+    ran = 0
+    while not stop.is_set():
+        job = None
+        try:
+            job = claim(name)
+            if job is not None:
+                run(job)
+                ran += 1
+        except Exception:
+            # e.g. the database is unreachable: keep polling
+            logger.exception('Worker %s could not claim a job', name)
+        finally:
+            close_old_connections()
+        if job is None:
+            if once:
+                break
+            stop.wait(poll)
+    return ran
+
+
+# ----- Tasks -----
+
+@task
+def delete_records(owner=None, ids=None, chunk_size=500):
+    """Delete a user's records (or the given ids) a chunk per transaction."""
+    records = Record.objects.order_by('pk')
+    if owner is not None:
+        records = records.filter(created_by_id=owner)
+    if ids is not None:
+        records = records.filter(pk__in=ids)
+    deleted = 0
+    while True:
+        chunk = list(records.values_list('pk', flat=True)[:chunk_size])
+        if not chunk:
+            return {'deleted': deleted}
+
+        def apply():
+            with counters.batched(), changes.batched():
+                return Record.objects.filter(pk__in=chunk).delete()[0]
+        deleted += retry_on_locked(apply)()
+
+
+@task
+def rebuild_counters():
+    values = counters.rebuild()
+    return {'users': values[counters.TOTAL_USERS], 'records': values[counters.TOTAL_RECORDS]}
+
+
+@task
+def compact_changes(days=None):
+    days = settings.RECORD_CHANGES_RETENTION_DAYS if days is None else days
+    superseded, expired = changes.compact(timedelta(days=days))
+    return {'superseded': superseded, 'expired': expired}
+
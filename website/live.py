@@ -0,0 +1,134 @@
+"""
+Pub/sub for the live records workspace.
+
+Committed change-log entries (website/changes.py) are published here and fanned
+out to every open ``manage/records/events`` stream in the process. The default
+broker is in-process only, which is enough for a single ASGI worker; with
+several workers set DJANGO_LIVE_EVENTS_BROKER to a Redis URL (needs the
+``redis`` package) so every worker hears every write.
+
+Subscribers are asyncio queues. publish() may be called from any thread (the
+writes happen in sync views); a subscriber that falls more than
+LIVE_EVENTS_QUEUE events behind is marked overflowed and its stream ends, and
+the browser reconnects and catches up from the change log.
+"""
+import asyncio
+import functools
+import json
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+CHANNEL = 'crud:records'
+
+
+class Subscription:
+    def __init__(self, broker, size):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=size)
+        self.overflowed = False
+
+    def push(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # the loop has closed under us
+            self.close()
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalBroker:
+    """Fan-out within this process. Also the stand-in for Redis in development and tests."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, events):
+        self._dispatch(events)
+
+    def subscribe(self):
+        subscription = Subscription(self, settings.LIVE_EVENTS_QUEUE)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _dispatch(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for event in events:
+                subscription.push(event)
+
+
+class RedisBroker(LocalBroker):
+    """
+    Publishes through a Redis channel; one listener task per process relays the
+    channel to the local subscribers, however many streams are open.
+    """
+
+    def __init__(self, url):
+        super().__init__()
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as exc:
+            raise ImproperlyConfigured('DJANGO_LIVE_EVENTS_BROKER is a Redis URL but redis is not installed.') from exc
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._async_redis = redis.asyncio
+        self._listener = None
+
+    def publish(self, events):
+        self._client.publish(CHANNEL, json.dumps(events))
+
+    def subscribe(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.ensure_future(self._listen())
+        return super().subscribe()
+
+    async def _listen(self):
+        client = self._async_redis.from_url(self.url)
+        async with client.pubsub() as pubsub:
+            await pubsub.subscribe(CHANNEL)
+            async for message in pubsub.listen():
+                if message['type'] == 'message':
+                    self._dispatch(json.loads(message['data']))
+
+
+@functools.lru_cache(maxsize=None)
+def broker():
+    url = settings.LIVE_EVENTS_BROKER
+    return RedisBroker(url) if url else LocalBroker()
+
+
+def publish(events):
+    """Send ``[{"cursor": ..., "op": ..., "id": ...}, ...]`` to every open stream."""
+    if events:
+        broker().publish(events)
@@ -0,0 +1,34 @@
+"""
+Template loader that strips indentation from HTML templates as they load.
+
+The templates nest Tailwind markup many levels deep, so a good part of every
+rendered page is leading spaces. Any whitespace run containing a line break
+collapses to a single newline, which renders the same outside <pre>,
+<textarea> and <script> (left as written). Work is done once per template
+under the cached loader, not per render. Off with DJANGO_COMPACT_TEMPLATES=0.
+"""
+import re
+
+from django.conf import settings
+from django.template.loaders import app_directories
+
+_PRESERVE = re.compile(r'<(pre|textarea|script)\b.*?</\1\s*>', re.S | re.I)
+_LINE_BREAK = re.compile(r'\s*\n\s*')
+
+
+def compact(source):
+    parts, pos = [], 0
+    for match in _PRESERVE.finditer(source):
+        parts.append(_LINE_BREAK.sub('\n', source[pos:match.start()]))
+        parts.append(match.group())
+        pos = match.end()
+    parts.append(_LINE_BREAK.sub('\n', source[pos:]))
+    return ''.join(parts)
+
+
+class CompactLoader(app_directories.Loader):
+    def get_contents(self, origin):
+        contents = super().get_contents(origin)
+        if settings.COMPACT_TEMPLATES and origin.name.endswith('.html'):
+            return compact(contents)
+        return contents
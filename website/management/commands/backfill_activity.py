@@ -0,0 +1,32 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from website import activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the dashboard's daily activity rows from the record and user tables, e.g. after "
+        "deploying or an import. Counts never go down, so running it again is safe."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=max(activity.TREND_DAYS),
+                            help='Days back from today to fill (default: the longest trend).')
+        parser.add_argument('--since', type=datetime.date.fromisoformat,
+                            help='Fill from this date (YYYY-MM-DD) instead of --days.')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options['since'] is not None:
+            first_day = options['since']
+        elif options['days'] < 1:
+            raise CommandError('--days must be positive.')
+        else:
+            first_day = today - datetime.timedelta(days=options['days'] - 1)
+        if first_day > today:
+            raise CommandError('--since must not be in the future.')
+        days = activity.backfill(first_day, today)
+        self.stdout.write(self.style.SUCCESS(f'Filled {days} day(s) from {first_day} to {today}.'))
@@ -0,0 +1,93 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from website.benchmarks import SUITES, isolated_database
+
+# metrics where a bigger number in the new run is a regression
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'peak_kb', 'bytes')
+
+
+def _integers(value):
+    try:
+        return [int(size) for size in value.split(',') if size]
+    except ValueError:
+        raise CommandError(f'Expected comma-separated integers, got {value!r}.')
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark suite (seeded into a throwaway database) and print latency percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES))
+        parser.add_argument('--records', type=int, default=20000, help='Records to seed (default: 20000).')
+        parser.add_argument(
+            '--sizes', type=_integers, default=[10000, 100000],
+            help='Record counts for the views suite, e.g. 10000,100000,1000000 (default: 10000,100000).',
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per measurement (default: 20).')
+        parser.add_argument('--terms', nargs='*', help='Search terms for the search suite.')
+        parser.add_argument(
+            '--target', action='append',
+            help='Load suite: a running server to drive, optionally labelled, e.g. '
+                 'wsgi=http://127.0.0.1:8000 (repeatable; default: http://127.0.0.1:8000).',
+        )
+        parser.add_argument('--paths', nargs='*', help="Load suite: paths requested in turn (default: '/').")
+        parser.add_argument('--cookie', help='Load suite: Cookie header to send, e.g. sessionid=... for logged-in pages.')
+        parser.add_argument(
+            '--concurrency', type=_integers, default=[50, 200, 500],
+            help='Load suite: concurrent clients per run (default: 50,200,500).',
+        )
+        parser.add_argument('--duration', type=float, default=10, help='Load/contention suites: seconds per run (default: 10).')
+        parser.add_argument('--writers', type=int, default=4, help='Contention suite: writer processes (default: 4).')
+        parser.add_argument('--readers', type=int, default=8, help='Contention suite: reader processes (default: 8).')
+        parser.add_argument('--db-file', help='Seed into this SQLite file instead of an in-memory database.')
+        parser.add_argument('--output', help='Also write the results as JSON to this path.')
+        parser.add_argument('--compare', help='A previous --output file to diff the results against.')
+        parser.add_argument(
+            '--tolerance', type=float, default=1.2,
+            help='With --compare, flag metrics that grew by more than this factor (default: 1.2).',
+        )
+
+    def handle(self, *args, **options):
+        func, isolated = SUITES[options['suite']]
+        # DEBUG would log every query in memory and skew both time and memory numbers
+        with override_settings(DEBUG=False):
+            if isolated:
+                with isolated_database(options['db_file']):
+                    results = func(options)
+            else:
+                results = func(options)
+
+        for label, stats in results.items():
+            line = '  '.join(f'{key}={value}' for key, value in stats.items())
+            self.stdout.write(f'{label:<40} {line}')
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+        if options['compare']:
+            self.compare(results, options['compare'], options['tolerance'])
+
+    def compare(self, results, path, tolerance):
+        with open(path) as fh:
+            baseline = json.load(fh)
+        regressions = 0
+        for label, stats in results.items():
+            before = baseline.get(label)
+            if before is None:
+                continue
+            for metric in COMPARED:
+                old, new = before.get(metric), stats.get(metric)
+                if not old or new is None:
+                    continue
+                ratio = new / old
+                if ratio > tolerance:
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(f'{label} {metric}: {old} -> {new} ({ratio:.2f}x)'))
+                elif ratio < 1 / tolerance:
+                    self.stdout.write(self.style.SUCCESS(f'{label} {metric}: {old} -> {new} ({ratio:.2f}x)'))
+        if regressions:
+            raise CommandError(f'{regressions} metric(s) regressed beyond {tolerance}x against {path}.')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {path}.'))
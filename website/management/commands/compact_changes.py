@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from website import changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Compact the record change log: keep only the newest event per record and drop events "
+        "older than the retention window (run periodically, e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.RECORD_CHANGES_RETENTION_DAYS,
+            help='Keep events from the last N days (default: DJANGO_RECORD_CHANGES_RETENTION_DAYS).',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative.')
+        superseded, expired = changes.compact(timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Dropped {superseded} superseded and {expired} expired changes; "
+            f"cursors before {changes.horizon()} must resync."
+        ))
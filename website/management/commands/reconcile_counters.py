@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from website import counters
+from website.models import Counter
+
+
+class Command(BaseCommand):
+    help = "Rebuild the site counters from the user and record tables (run periodically, e.g. from cron)."
+
+    def handle(self, *args, **options):
+        before = dict(Counter.objects.values_list('key', 'value'))
+        after = counters.rebuild()
+        drifted = {key: (before.get(key, 0), n) for key, n in after.items() if before.get(key, 0) != n}
+        pruned = len(set(before) - set(after))
+        for key, (old, new) in sorted(drifted.items()):
+            self.stdout.write(f"{key}: {old} -> {new}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {len(after)} counters ({len(drifted)} corrected, {pruned} expired buckets dropped)."
+        ))
@@ -0,0 +1,88 @@
+import multiprocessing
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from website import jobs
+
+
+def _serve(threads, poll, once, stop):
+    """One worker process: ``threads`` claim loops sharing ``stop``. Returns jobs run."""
+    counts = [0] * threads
+
+    def loop(index):
+        try:
+            counts[index] = jobs.work(stop, poll=poll, once=once)
+        finally:
+            connections.close_all()
+
+    pool = [threading.Thread(target=loop, args=(i,), name=f'job-worker-{i}') for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        # join with a timeout so the main thread still sees SIGINT/SIGTERM
+        while thread.is_alive():
+            thread.join(0.5)
+    return sum(counts)
+
+
+def _child(threads, poll, once):
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    _serve(threads, poll, once, stop)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs (website/jobs.py) from the Job table. Each process runs --threads "
+        "claim loops; SIGINT/SIGTERM lets running jobs finish, then exits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=settings.JOBS_WORKER_PROCESSES,
+                            help='Worker processes (default: DJANGO_JOBS_WORKER_PROCESSES).')
+        parser.add_argument('--threads', type=int, default=settings.JOBS_WORKER_THREADS,
+                            help='Jobs run at once per process (default: DJANGO_JOBS_WORKER_THREADS).')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between polls of an empty queue.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is runnable instead of polling.')
+
+    def handle(self, *args, **options):
+        processes, threads = options['processes'], options['threads']
+        if processes < 1 or threads < 1:
+            raise CommandError('--processes and --threads must be positive.')
+        self.stdout.write(f'Worker starting: {processes} process(es) x {threads} thread(s).')
+
+        if processes == 1:
+            stop = threading.Event()
+            previous = {signum: signal.signal(signum, lambda *_: stop.set()) for signum in (signal.SIGINT, signal.SIGTERM)}
+            try:
+                ran = _serve(threads, options['poll'], options['once'], stop)
+            finally:
+                for signum, handler in previous.items():
+                    signal.signal(signum, handler)
+            self.stdout.write(self.style.SUCCESS(f'Worker stopped after {ran} job(s).'))
+            return
+
+        # children must open their own connections, not inherit the parent's
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(target=_child, args=(threads, options['poll'], options['once']), name=f'job-worker-p{i}')
+            for i in range(processes)
+        ]
+        for child in children:
+            child.start()
+        # pass SIGTERM on; each child lets its running jobs finish
+        signal.signal(signal.SIGTERM, lambda *_: [child.terminate() for child in children])
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            # the children got the SIGINT too and are finishing their jobs
+            for child in children:
+                child.join()
+        self.stdout.write(self.style.SUCCESS('Worker stopped.'))
@@ -0,0 +1,206 @@
+"""
+In-process request metrics: latency, DB time, query count and template time per
+resolved URL name, kept as fixed-bucket histograms.
+
+Every worker process keeps its own numbers (scrape each worker, or aggregate in
+Prometheus). Recording a sample is a few additions under a lock; unsampled requests
+(see METRICS_SAMPLE_RATE) pass through the DB and template hooks untouched.
+Template time comes from the DjangoTemplates backend below, configured in TEMPLATES.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends import django as django_backend
+
+# upper bounds; the last bucket is +Inf
+TIME_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+METRICS = (
+    ('request_ms', 'Request latency in milliseconds', TIME_BUCKETS_MS),
+    ('db_ms', 'Time spent in database queries in milliseconds', TIME_BUCKETS_MS),
+    ('queries', 'Database queries per request', COUNT_BUCKETS),
+    ('template_ms', 'Template rendering time in milliseconds', TIME_BUCKETS_MS),
+)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (like histogram_quantile)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds + (float('inf'),), self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, **values):
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = self._views[view] = {name: Histogram(bounds) for name, _, bounds in METRICS}
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def snapshot(self):
+        """{view: {metric: Histogram copy}} taken under the lock."""
+        with self._lock:
+            copy = {}
+            for view, histograms in self._views.items():
+                copy[view] = {}
+                for name, hist in histograms.items():
+                    clone = Histogram(hist.bounds)
+                    clone.counts, clone.count, clone.sum = list(hist.counts), hist.count, hist.sum
+                    copy[view][name] = clone
+            return copy
+
+    def summary(self):
+        rows = []
+        for view, histograms in sorted(self.snapshot().items()):
+            request = histograms['request_ms']
+            rows.append({
+                'view': view,
+                'requests': request.count,
+                'p50_ms': request.quantile(0.5),
+                'p95_ms': request.quantile(0.95),
+                'p99_ms': request.quantile(0.99),
+                'mean_ms': round(request.sum / request.count, 2) if request.count else None,
+                'mean_db_ms': round(histograms['db_ms'].sum / request.count, 2) if request.count else None,
+                'mean_queries': round(histograms['queries'].sum / request.count, 1) if request.count else None,
+                'mean_template_ms': round(histograms['template_ms'].sum / request.count, 2) if request.count else None,
+            })
+        return rows
+
+    def prometheus(self):
+        lines = []
+        snapshot = self.snapshot()
+        for name, help_text, bounds in METRICS:
+            metric = f'crud_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for view, histograms in sorted(snapshot.items()):
+                hist = histograms[name]
+                cumulative = 0
+                for bound, n in zip(bounds + (float('inf'),), hist.counts):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'{metric}_bucket{{view="{view}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{view="{view}"}} {hist.sum:.3f}')
+                lines.append(f'{metric}_count{{view="{view}"}} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestSample:
+    __slots__ = ('queries', 'template_ms', 'rendering')
+
+    def __init__(self):
+        # (ms, sql) appended by _db_hook, possibly from several threads at once (async views)
+        self.queries = []
+        self.template_ms = 0.0
+        self.rendering = False
+
+    @property
+    def db_ms(self):
+        return sum(ms for ms, _ in self.queries)
+
+    def slowest(self, n=5):
+        return sorted(self.queries, key=lambda query: query[0], reverse=True)[:n]
+
+
+current_sample = ContextVar('current_sample', default=None)
+
+
+def _db_hook(execute, sql, params, many, context):
+    sample = current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries.append(((time.perf_counter() - started) * 1000, sql))
+
+
+def _add_db_hook(connection, **kwargs):
+    if _db_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_hook)
+
+
+class TimedTemplate(django_backend.Template):
+    def render(self, context=None, request=None):
+        sample = current_sample.get()
+        if sample is None or sample.rendering:
+            return super().render(context, request)
+        # only the outermost render counts; includes/extends happen inside it
+        sample.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample.template_ms += (time.perf_counter() - started) * 1000
+            sample.rendering = False
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """
+    The Django template backend, with renders timed into the current request's sample.
+
+    Set as the TEMPLATES backend. Outside a sampled request it costs one ContextVar lookup
+    per render.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+_installed = False
+
+
+def install():
+    """
+    Hook every database connection once per process.
+
+    The hook reads the sample from a ContextVar, so queries run in worker threads
+    through sync_to_async() are attributed to the request that started them.
+    """
+    global _installed
+    if _installed:
+        return
+    connection_created.connect(_add_db_hook, dispatch_uid='website.metrics')
+    for connection in connections.all(initialized_only=True):
+        _add_db_hook(connection)
+    _installed = True
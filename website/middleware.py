@@ -0,0 +1,275 @@
+import logging
+import os
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.utils.functional import SimpleLazyObject
+
+from . import auth, compression, metrics, storage
+from .routers import current_replica
+
+logger = logging.getLogger('website.metrics')
+
+
+class RequestMetricsMiddleware:
+    """
+    Time every sampled request and file it under its URL name in ``metrics.registry``.
+
+    Keep it first in MIDDLEWARE so the latency includes the other middleware. It runs
+    natively under both WSGI and ASGI, so it never forces async views onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        metrics.install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+        sample = metrics.RequestSample()
+        token = metrics.current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_sample.reset(token)
+        self.record(request, sample, started)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+        sample = metrics.RequestSample()
+        token = metrics.current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_sample.reset(token)
+        self.record(request, sample, started)
+        return response
+
+    def record(self, request, sample, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        db_ms = sample.db_ms
+        metrics.registry.record(
+            view,
+            request_ms=elapsed,
+            db_ms=db_ms,
+            queries=len(sample.queries),
+            template_ms=sample.template_ms,
+        )
+        if elapsed >= settings.METRICS_SLOW_REQUEST_MS:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, templates %.0f ms\n%s',
+                request.method, request.path, view, elapsed, len(sample.queries), db_ms,
+                sample.template_ms,
+                '\n'.join(f'  {ms:8.1f} ms  {sql}' for ms, sql in sample.slowest()),
+            )
+
+
+class ReadReplicaMiddleware:
+    """
+    Route this request's reads to a random replica (see website/routers.py) unless it
+    is a write, or the session wrote recently enough that a replica may not have
+    caught up yet (read-your-writes). Needs SessionMiddleware before it.
+    """
+    sync_capable = True
+    async_capable = True
+    PIN_KEY = '_replica_pin_until'
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not settings.READ_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = current_replica.set(self.choose(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        # the session is loaded from the database on first access
+        token = current_replica.set(await sync_to_async(self.choose)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_replica.reset(token)
+        await sync_to_async(self.pin)(request)
+        return response
+
+    def choose(self, request):
+        if request.method not in self.SAFE_METHODS:
+            return None
+        if request.session.get(self.PIN_KEY, 0) > time.time():
+            return None
+        return random.choice(settings.READ_REPLICAS)
+
+    def pin(self, request):
+        if request.method not in self.SAFE_METHODS:
+            request.session[self.PIN_KEY] = time.time() + settings.READ_REPLICA_PIN_SECONDS
+
+
+class CompressionMiddleware:
+    """
+    gzip or brotli (website/compression.py) text responses for clients that accept it.
+
+    Small responses, ones that already have a Content-Encoding and event streams (which
+    must reach the browser as each event is written) go out as they are. Streaming
+    responses are compressed chunk by chunk. Keep it above anything that reads or
+    changes the body on the way out.
+    """
+    sync_capable = True
+    async_capable = True
+    TYPES = ('text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript', 'application/javascript',
+             'application/json', 'application/x-ndjson', 'image/svg+xml')
+
+    def __init__(self, get_response):
+        if not settings.COMPRESSION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in self.TYPES or response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compression.acompress_chunks(response.streaming_content, coding)
+            else:
+                response.streaming_content = compression.compress_chunks(response.streaming_content, coding)
+            del response.headers['Content-Length']
+        else:
+            compressed = compression.compress(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # the bytes changed, so a strong validator no longer holds (RFC 9110 8.8.1)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+        return response
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collectstatic's output (website/storage.py) from the app when there is no
+    web server or CDN in front. Files are indexed once at startup, so a deploy that
+    runs collectstatic restarts the workers anyway. Hashed names are cached for a
+    year as immutable; anything else is revalidated after STATIC_MAX_AGE seconds.
+    """
+    sync_capable = True
+    async_capable = True
+    IMMUTABLE = 'public, max-age=31536000, immutable'
+
+    def __init__(self, get_response):
+        if not settings.STATIC_PIPELINE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        self.files = storage.index(str(settings.STATIC_ROOT), hashed)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        static = self.files.get(request.path[len(self.prefix):])
+        if static is None:
+            return None
+        variants = static.variants
+        # smallest first, so it wins between equally acceptable codings
+        codings = sorted((c for c in variants if c), key=lambda c: variants[c][1])
+        coding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''), codings)
+        path, size = variants[coding]
+        mtime = int(os.path.getmtime(static.path))
+        etag = f'"{mtime:x}-{size:x}{"-" + coding if coding else ""}"'
+        response = get_conditional_response(request, etag=etag, last_modified=mtime)
+        if response is None:
+            response = FileResponse(open(path, 'rb'), content_type=static.content_type)
+            # FileResponse names the file it read, which may be the .gz/.br sibling
+            del response.headers['Content-Disposition']
+            if request.method == 'HEAD':
+                response.file_to_stream.close()
+                response.streaming_content = []
+            response.headers['Content-Length'] = str(size)
+            if coding:
+                response.headers['Content-Encoding'] = coding
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(mtime)
+        response.headers['Cache-Control'] = self.IMMUTABLE if static.immutable else f'public, max-age={settings.STATIC_MAX_AGE}'
+        if codings:
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+def _get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = auth.get_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that reads the user row through website/auth.py's cache."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
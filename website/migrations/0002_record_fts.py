@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.db import migrations, OperationalError
+
+FTS_TABLE = 'website_record_fts'
+
+# NOTE: SQLite drops these triggers whenever Django rebuilds website_record (most
+# AlterField/RemoveField operations). Later migrations should stick to AddIndex /
+# AddField, or drop and recreate the index around the rebuild.
+
+
+def create_fts_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    record_table = apps.get_model('website', 'Record')._meta.db_table
+    user_table = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    owner = f"COALESCE((SELECT username FROM {user_table} WHERE id = new.created_by_id), '')"
+
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "title, description, owner, prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5: website.search falls back to LIKE queries
+            return
+        cursor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {record_table} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, title, description, owner) "
+            f"VALUES (new.id, new.title, new.description, {owner}); "
+            "END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, description, created_by_id ON {record_table} "
+            "WHEN old.title IS NOT new.title OR old.description IS NOT new.description "
+            "OR old.created_by_id IS NOT new.created_by_id BEGIN "
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; "
+            f"INSERT INTO {FTS_TABLE}(rowid, title, description, owner) "
+            f"VALUES (new.id, new.title, new.description, {owner}); "
+            "END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {record_table} BEGIN "
+            f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; "
+            "END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_owner_au AFTER UPDATE OF username ON {user_table} "
+            "WHEN old.username IS NOT new.username BEGIN "
+            f"UPDATE {FTS_TABLE} SET owner = new.username "
+            f"WHERE rowid IN (SELECT id FROM {record_table} WHERE created_by_id = new.id); "
+            "END"
+        )
+        # title and owner matches outrank description-only ones (read via the rank column)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 5.0)')")
+        # backfill rows that existed before the index
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, title, description, owner) "
+            f"SELECT r.id, r.title, r.description, COALESCE(u.username, '') "
+            f"FROM {record_table} r LEFT JOIN {user_table} u ON u.id = r.created_by_id"
+        )
+
+
+def drop_fts_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for suffix in ('ai', 'au', 'ad', 'owner_au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('website', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
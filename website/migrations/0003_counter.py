@@ -0,0 +1,48 @@
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+
+def backfill_counters(apps, schema_editor):
+    # a frozen copy of website.counters.rebuild() as of this migration: totals, plus
+    # hourly joined/active buckets for the last 8 days
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Record = apps.get_model('website', 'Record')
+    Counter = apps.get_model('website', 'Counter')
+
+    since = timezone.now() - timedelta(days=8)
+    values = {'users': User.objects.count(), 'records': Record.objects.count()}
+    for prefix, field in (('users.joined:', 'date_joined'), ('users.active:', 'last_login')):
+        hours = (
+            User.objects.filter(**{f'{field}__gte': since})
+            .annotate(hour=TruncHour(field, tzinfo=dt_timezone.utc))
+            .values('hour')
+            .annotate(n=Count('id'))
+            .values_list('hour', 'n')
+        )
+        for hour, n in hours:
+            values[prefix + hour.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H')] = n
+    Counter.objects.bulk_create(Counter(key=key, value=n) for key, n in values.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('website', '0002_record_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
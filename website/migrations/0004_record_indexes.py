@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('website', '0003_counter'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='record',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['-created_at', '-id'], name='record_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['created_by', '-created_at'], name='record_owner_created_idx'),
+        ),
+        # auth.User is not ours to add Meta.indexes to; index the dashboard/admin filters directly
+        migrations.RunSQL(
+            'CREATE INDEX website_user_date_joined_idx ON auth_user (date_joined)',
+            'DROP INDEX website_user_date_joined_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX website_user_last_login_idx ON auth_user (last_login)',
+            'DROP INDEX website_user_last_login_idx',
+        ),
+    ]
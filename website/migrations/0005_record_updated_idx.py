@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0004_record_indexes'),
+    ]
+
+    operations = [
+        # MAX(updated_at) for the records list ETag
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['updated_at'], name='record_updated_idx'),
+        ),
+    ]
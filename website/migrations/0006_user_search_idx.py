@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0005_record_updated_idx'),
+    ]
+
+    operations = [
+        # prefix search in the user directory compares lower(username) / lower(email)
+        # ranges (website/search.py:search_users); expression indexes let it seek
+        migrations.RunSQL(
+            'CREATE INDEX website_user_username_lower_idx ON auth_user ((LOWER(username)))',
+            'DROP INDEX website_user_username_lower_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX website_user_email_lower_idx ON auth_user ((LOWER(email)))',
+            'DROP INDEX website_user_email_lower_idx',
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('website', '0008_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('records_created', models.PositiveIntegerField(default=0)),
+                ('records_updated', models.PositiveIntegerField(default=0)),
+                ('users_joined', models.PositiveIntegerField(default=0)),
+                ('users_active', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'daily activity',
+                'ordering': ['day'],
+            },
+        ),
+    ]
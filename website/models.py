@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Record(models.Model):
@@ -10,7 +11,88 @@ class Record(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="record_created_idx"),
+            models.Index(fields=["created_by", "-created_at"], name="record_owner_created_idx"),
+            models.Index(fields=["updated_at"], name="record_updated_idx"),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class Counter(models.Model):
+    """A denormalized count kept current by signals; see website/counters.py."""
+    key = models.CharField(max_length=64, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}={self.value}"
+
+
+class RecordChange(models.Model):
+    """One create/update/delete of a record, in commit order; see website/changes.py."""
+    CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+    OPS = [(CREATE, 'Create'), (UPDATE, 'Update'), (DELETE, 'Delete')]
+
+    # not a foreign key: the log outlives deleted records
+    record_id = models.BigIntegerField()
+    op = models.CharField(max_length=6, choices=OPS)
+    at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["record_id", "id"], name="recordchange_record_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.op} record {self.record_id}"
+
+
+class Job(models.Model):
+    """A unit of background work, run by `manage.py run_worker`; see website/jobs.py."""
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=7, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=200, blank=True)
+    # a running job still unfinished past this (its worker died) is claimed again
+    locked_until = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="jobs")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="job_ready_idx"),
+            models.Index(fields=["status", "locked_until"], name="job_lease_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class DailyActivity(models.Model):
+    """Per-day activity for the dashboard trends, filled by website/activity.py."""
+    day = models.DateField(primary_key=True)
+    records_created = models.PositiveIntegerField(default=0)
+    records_updated = models.PositiveIntegerField(default=0)
+    users_joined = models.PositiveIntegerField(default=0)
+    users_active = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["day"]
+        verbose_name_plural = "daily activity"
+
+    def __str__(self):
+        return str(self.day)
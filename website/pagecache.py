@@ -0,0 +1,156 @@
+"""
+Whole-page cache for anonymous visitors, used on the public home page.
+
+A request without a session or messages cookie gets the cached page for
+PAGE_CACHE_SECONDS. Logged-in users always carry a session cookie, so they (and
+anyone with flash messages waiting) go straight to the view. Creating or
+deleting records bumps a version stamp once committed (website/changes.py), which
+makes every cached page stale at once.
+
+When a page is missing or stale, one request takes a short lock and renders it.
+The others get the stale copy if PAGE_CACHE_STALE_SECONDS allows one
+(stale-while-revalidate). Otherwise they wait up to WAIT_SECONDS for the new
+copy, so a crawler burst after an expiry costs one render, not hundreds.
+Pages that set cookies, used a CSRF token or aren't plain 200s are never stored.
+"""
+import asyncio
+import functools
+import time
+from collections import namedtuple
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .conditional import templates_version
+
+VERSION_KEY = 'pagecache:version'
+# renders slower than this let a second request try
+LOCK_SECONDS = 10
+WAIT_SECONDS = 2
+POLL_SECONDS = 0.05
+
+Entry = namedtuple('Entry', 'version created content content_type')
+
+
+def invalidate():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _bypass(request):
+    return (
+        settings.PAGE_CACHE_SECONDS <= 0
+        or request.method not in ('GET', 'HEAD')
+        or settings.SESSION_COOKIE_NAME in request.COOKIES
+        or CookieStorage.cookie_name in request.COOKIES
+    )
+
+
+def _keys(request):
+    # a deploy with new templates or another icon mode starts from a clean slate
+    page = f'{templates_version()}:{settings.UI_ICONS_SPRITE}:{request.path}'
+    return f'pagecache:{page}', f'pagecache:lock:{page}'
+
+
+def _state(values, key):
+    """(version, entry, fresh) from a get_many() of the version stamp and the page."""
+    version = values.get(VERSION_KEY, 0)
+    entry = values.get(key)
+    fresh = (
+        entry is not None and entry.version == version
+        and time.time() - entry.created < settings.PAGE_CACHE_SECONDS
+    )
+    return version, entry, fresh
+
+
+def _usable_stale(entry):
+    return entry is not None and settings.PAGE_CACHE_STALE_SECONDS > 0
+
+
+def _entry(request, response, version):
+    """The cache entry for ``response``, or None if it must not be shared."""
+    if (
+        response.status_code != 200 or response.streaming or response.cookies
+        or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    ):
+        return None
+    return Entry(version, time.time(), response.content, response['Content-Type'])
+
+
+def _timeout():
+    return settings.PAGE_CACHE_SECONDS + settings.PAGE_CACHE_STALE_SECONDS
+
+
+def _respond(entry, state):
+    response = HttpResponse(entry.content, content_type=entry.content_type)
+    # a session cookie gets the live page
+    patch_vary_headers(response, ('Cookie',))
+    return _mark(response, state)
+
+
+def _mark(response, state):
+    response.headers['X-Page-Cache'] = state
+    return response
+
+
+def anonymous(view):
+    """Serve ``view`` from the page cache to anonymous visitors. Works on sync and async views."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if _bypass(request):
+                return await view(request, *args, **kwargs)
+            key, lock = _keys(request)
+            version, entry, fresh = _state(await cache.aget_many([VERSION_KEY, key]), key)
+            if fresh:
+                return _respond(entry, 'hit')
+            if await cache.aadd(lock, True, LOCK_SECONDS):
+                try:
+                    response = await view(request, *args, **kwargs)
+                    new = _entry(request, response, version)
+                    if new is not None:
+                        await cache.aset(key, new, _timeout())
+                finally:
+                    await cache.adelete(lock)
+                return _mark(response, 'miss')
+            if _usable_stale(entry):
+                return _respond(entry, 'stale')
+            deadline = time.monotonic() + WAIT_SECONDS
+            while time.monotonic() < deadline:
+                await asyncio.sleep(POLL_SECONDS)
+                entry = await cache.aget(key)
+                if entry is not None and entry.version >= version:
+                    return _respond(entry, 'hit')
+            return _mark(await view(request, *args, **kwargs), 'miss')
+        return wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if _bypass(request):
+            return view(request, *args, **kwargs)
+        key, lock = _keys(request)
+        version, entry, fresh = _state(cache.get_many([VERSION_KEY, key]), key)
+        if fresh:
+            return _respond(entry, 'hit')
+        if cache.add(lock, True, LOCK_SECONDS):
+            try:
+                response = view(request, *args, **kwargs)
+                new = _entry(request, response, version)
+                if new is not None:
+                    cache.set(key, new, _timeout())
+            finally:
+                cache.delete(lock)
+            return _mark(response, 'miss')
+        if _usable_stale(entry):
+            return _respond(entry, 'stale')
+        deadline = time.monotonic() + WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            entry = cache.get(key)
+            if entry is not None and entry.version >= version:
+                return _respond(entry, 'hit')
+        return _mark(view(request, *args, **kwargs), 'miss')
+    return wrapper
@@ -0,0 +1,156 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Return the list of key values stored in ``token``, or None if it is malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed ordering, e.g. ("-created_at", "-id").
+
+    Every page is fetched with a ``WHERE (key) < (cursor) ... LIMIT n`` query, so
+    page N costs the same as page 1 as long as the ordering is backed by an index.
+    The last key must be unique (normally the primary key). NULLs sort as the
+    smallest value, like SQLite does natively.
+    """
+
+    def __init__(self, queryset, ordering=("-created_at", "-id"), per_page=24):
+        self.queryset = queryset
+        self.keys = [(key.lstrip("-"), key.startswith("-")) for key in ordering]
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        """Return the page following cursor ``after``, or preceding cursor ``before``."""
+        backwards = False
+        qs = self.queryset
+        cursor = self.parse(before)
+        if cursor is not None:
+            backwards = True
+        else:
+            cursor = self.parse(after)
+        if cursor is not None:
+            qs = qs.filter(self._seek(cursor, backwards))
+
+        rows = list(qs.order_by(*self._order_by(backwards))[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows)
+        more_after = has_more if not backwards else True
+        more_before = cursor is not None if not backwards else has_more
+        return KeysetPage(
+            rows,
+            next_cursor=self.cursor_for(rows[-1]) if more_after else None,
+            prev_cursor=self.cursor_for(rows[0]) if more_before else None,
+        )
+
+    def cursor_for(self, obj):
+        # rows may be model instances or values() dicts
+        if isinstance(obj, dict):
+            return encode_cursor([obj[name] for name, _ in self.keys])
+        return encode_cursor([getattr(obj, name) for name, _ in self.keys])
+
+    def parse(self, token):
+        """The key values in ``token``, or None if it is malformed or was made for another ordering."""
+        values = decode_cursor(token)
+        if values is None or len(values) != len(self.keys):
+            return None
+        parsed = []
+        for (name, _), value in zip(self.keys, values):
+            try:
+                field = self.queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # annotations (a search rank) are numbers and round-trip through JSON as-is
+                if type(value) not in (int, float):
+                    return None
+                parsed.append(value)
+                continue
+            try:
+                parsed.append(None if value is None else field.to_python(value))
+            except Exception:
+                return None
+        return parsed
+
+    def _order_by(self, backwards):
+        order = []
+        for name, descending in self.keys:
+            if descending != backwards:
+                order.append(F(name).desc(nulls_last=True) if self._nullable(name) else F(name).desc())
+            else:
+                order.append(F(name).asc(nulls_first=True) if self._nullable(name) else F(name).asc())
+        return order
+
+    def _nullable(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name).null
+        except FieldDoesNotExist:
+            return False
+
+    def _seek(self, cursor, backwards):
+        # (a, b) after (x, y)  ==  a beyond x  OR  (a = x AND b beyond y)
+        clauses = []
+        equal = Q()
+        for (name, descending), value in zip(self.keys, cursor):
+            clauses.append(equal & self._beyond(name, value, descending != backwards))
+            equal &= Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+        seek = reduce(lambda a, b: a | b, clauses)
+        # a plain range on the leading key lets the database seek the index instead of
+        # walking it from the start to evaluate the OR above
+        name, descending = self.keys[0]
+        if cursor[0] is not None and not self._nullable(name):
+            lookup = "lte" if descending != backwards else "gte"
+            seek &= Q(**{f"{name}__{lookup}": cursor[0]})
+        return seek
+
+    def _beyond(self, name, value, smaller):
+        if smaller:
+            if value is None:
+                return Q(pk__in=[])
+            lookup = Q(**{f"{name}__lt": value})
+            return lookup | Q(**{f"{name}__isnull": True}) if self._nullable(name) else lookup
+        if value is None:
+            return Q(**{f"{name}__isnull": False})
+        return Q(**{f"{name}__gt": value})
@@ -0,0 +1,50 @@
+"""
+Staff/superuser changes for many users in one ``UPDATE ... WHERE id IN``.
+
+The acting superuser is always left out (no self-lockout), and revoking
+superuser only matches while some superuser outside the batch remains, checked
+by an EXISTS in the same statement rather than by counting first. ``update()``
+skips the User signals, so cached users are forgotten here instead.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists
+
+from . import auth
+from .sqlite import retry_on_locked
+
+ACTIONS = {
+    'grant_staff': {'is_staff': True},
+    'revoke_staff': {'is_staff': False},
+    # superusers should be staff as well
+    'grant_superuser': {'is_superuser': True, 'is_staff': True},
+    'revoke_superuser': {'is_superuser': False},
+}
+ACTION_LABELS = (
+    ('grant_staff', 'Make admin'),
+    ('revoke_staff', 'Remove admin'),
+    ('grant_superuser', 'Make superuser'),
+    ('revoke_superuser', 'Remove superuser'),
+)
+
+
+def change_roles(actor, user_ids, action):
+    """Apply ``action`` to the users in ``user_ids`` other than ``actor``; return how many rows changed."""
+    values = ACTIONS[action]
+    user_ids = {int(pk) for pk in user_ids} - {actor.pk}
+    if not user_ids:
+        return 0
+    # rows already in the target state are left untouched
+    targets = User.objects.filter(pk__in=user_ids).exclude(**values)
+    if action == 'revoke_superuser':
+        others = User.objects.filter(is_superuser=True).exclude(pk__in=user_ids)
+        targets = targets.filter(Exists(others))
+
+    def apply():
+        updated = targets.update(**values)
+        transaction.on_commit(lambda: auth.forget_users(*user_ids))
+        return updated
+
+    updated = retry_on_locked(apply)()
+    auth.forget_users(*user_ids)
+    return updated
@@ -0,0 +1,40 @@
+"""
+Send reads to a read replica (settings.READ_REPLICAS) and everything else to
+``default``.
+
+Reads only leave the primary while ReadReplicaMiddleware has picked a replica
+for the current request: safe-method requests whose session hasn't written in
+the last READ_REPLICA_PIN_SECONDS. Management commands, writes and reads inside
+a transaction stay on the primary.
+"""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# alias chosen for this request, or None for the primary
+current_replica = ContextVar('current_replica', default=None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = current_replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # explicit, or Django would write an instance back to the replica it was read from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.READ_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas are copies of the primary; they receive its schema, not migrations
+        if db in settings.READ_REPLICAS:
+            return False
+        return None
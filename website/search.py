@@ -0,0 +1,89 @@
+import re
+import string
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+
+FTS_TABLE = 'website_record_fts'
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+_fts_tables = {}
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fts_available(using='default'):
+    """True when the FTS5 index created by migration 0002 exists on this database."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    key = (using, str(connection.settings_dict['NAME']))
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            _fts_tables[key] = FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_tables[key]
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression: every word must appear, and the
+    last characters typed may be an unfinished word ("laun" finds "launch").
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_records(queryset, query):
+    """
+    Filter ``queryset`` down to records matching ``query``.
+
+    Returns ``(queryset, ordering)``. On SQLite with the FTS index the rows carry a
+    ``rank`` annotation (bm25, lower is better) and are ordered by it; other
+    databases fall back to case-insensitive substring matching in date order.
+    """
+    if not query:
+        return queryset, DEFAULT_ORDERING
+    if not fts_available(queryset.db):
+        return queryset.filter(
+            Q(title__icontains=query)
+            | Q(description__icontains=query)
+            | Q(created_by__username__icontains=query)
+        ), DEFAULT_ORDERING
+
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none(), DEFAULT_ORDERING
+    # Join the FTS table instead of correlating per row, so every MATCH is evaluated
+    # once; its hidden ``rank`` column is bm25 with the weights set by migration 0002.
+    table = queryset.model._meta.db_table
+    queryset = queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = "{table}"."id"', f'{FTS_TABLE} MATCH %s'],
+        params=[expression],
+    )
+    return queryset.annotate(rank=RawSQL(f'{FTS_TABLE}.rank', ())), ('rank', '-id')
+
+
+def _prefix_range(field, prefix):
+    # "ali" -> ali <= value < alj: a range the lower() expression indexes from
+    # migration 0006 can seek, where LIKE 'ali%' would scan every user
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+def search_users(queryset, query):
+    """
+    Filter ``queryset`` down to users whose username or email starts with ``query``,
+    ignoring case. On SQLite that is ASCII case only, as its LOWER() folds nothing
+    else: "ÉL" finds "Élan", "él" doesn't.
+    """
+    if connections[queryset.db].vendor == 'sqlite':
+        query = query.translate(_ASCII_LOWER)
+    else:
+        query = query.lower()
+    if not query:
+        return queryset
+    return queryset.alias(
+        username_lower=Lower('username'), email_lower=Lower('email'),
+    ).filter(_prefix_range('username_lower', query) | _prefix_range('email_lower', query))
@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import activity, auth, changes, counters
+from .models import Record
+
+_UNKNOWN = object()
+
+
+@receiver(post_init, sender=User)
+def remember_last_login(sender, instance, **kwargs):
+    # update_last_login overwrites the field before saving; keep the loaded value
+    # so the login can be moved out of its old activity bucket. Deferred fields are
+    # left alone rather than fetched.
+    instance._counted_last_login = instance.__dict__.get('last_login', _UNKNOWN)
+
+
+@receiver(post_save, sender=User)
+def count_user_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_counted_last_login', _UNKNOWN)
+    if created:
+        counters.bump(counters.TOTAL_USERS)
+        counters.bump(counters.bucket(counters.USERS_JOINED, instance.date_joined))
+    if previous is not _UNKNOWN and instance.last_login != previous:
+        if counters.in_retention(previous):
+            counters.bump(counters.bucket(counters.USERS_ACTIVE, previous), -1)
+        if instance.last_login is not None:
+            counters.bump(counters.bucket(counters.USERS_ACTIVE, instance.last_login))
+            activity.schedule_refresh()
+    elif created:
+        activity.schedule_refresh()
+    instance._counted_last_login = instance.last_login
+
+
+@receiver(post_delete, sender=User)
+def count_user_deleted(sender, instance, **kwargs):
+    counters.bump(counters.TOTAL_USERS, -1)
+    if counters.in_retention(instance.date_joined):
+        counters.bump(counters.bucket(counters.USERS_JOINED, instance.date_joined), -1)
+    if counters.in_retention(instance.last_login):
+        counters.bump(counters.bucket(counters.USERS_ACTIVE, instance.last_login), -1)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # staff/superuser toggles, password changes and last_login all go through save();
+    # forget again on commit in case a concurrent request re-cached the old row
+    auth.forget_users(instance.pk)
+    transaction.on_commit(lambda: auth.forget_users(instance.pk))
+
+
+@receiver(post_save, sender=Record)
+def count_record_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump(counters.TOTAL_RECORDS)
+
+
+@receiver(post_delete, sender=Record)
+def count_record_deleted(sender, instance, **kwargs):
+    counters.bump(counters.TOTAL_RECORDS, -1)
+
+
+@receiver(post_save, sender=Record)
+def log_record_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        changes.log(changes.CREATE if created else changes.UPDATE, [instance.pk])
+
+
+@receiver(post_delete, sender=Record)
+def log_record_deleted(sender, instance, **kwargs):
+    changes.log(changes.DELETE, [instance.pk])
+
+
+@receiver(pre_delete, sender=User)
+def log_records_orphaned(sender, instance, **kwargs):
+    # on_delete=SET_NULL rewrites created_by with a plain UPDATE, no Record signals
+    changes.log(changes.UPDATE, instance.records.values_list('pk', flat=True))
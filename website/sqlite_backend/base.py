@@ -0,0 +1,24 @@
+"""
+Django's SQLite backend, opening transactions with BEGIN IMMEDIATE under
+DJANGO_SQLITE_PROFILE=production (see website/sqlite.py).
+
+Django 5.1 has this built in as the "transaction_mode" option; on 4.2 the
+override below is the same one 5.1 makes. SqliteProfileTests checks that
+Django still calls the hook.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    immediate_transactions = False
+
+    def init_connection_state(self):
+        super().init_connection_state()
+        self.immediate_transactions = settings.SQLITE_PROFILE == 'production'
+
+    def _start_transaction_under_autocommit(self):
+        if self.immediate_transactions:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,130 @@
+"""
+Static files for serving straight from the app, without a CDN (DJANGO_STATIC_PIPELINE=1).
+
+``collectstatic`` with ``CompressedManifestStorage`` fingerprints every file
+(``style.css`` -> ``style.3f2a….css``, references inside CSS rewritten to
+match), writes ``.gz`` and, with the ``brotli`` package, ``.br`` siblings at
+the highest level once, and prunes files no manifest has referenced for
+STATIC_PRUNE_DAYS. The grace period keeps pages rendered before a deploy
+(in browsers, or in a cache) pointing at files that still exist.
+
+``StaticFilesMiddleware`` serves STATIC_ROOT from ``index()``: hashed names
+as immutable for a year, and the smallest sibling the client accepts.
+"""
+import logging
+import mimetypes
+import os
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+from . import compression
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.xml', '.html', '.ico', '.ttf', '.eot', '.otf')
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    # a sibling that saves less than this isn't worth a second file
+    MIN_SAVING = 0.05
+
+    def url_converter(self, name, hashed_files, template=None):
+        convert = super().url_converter(name, hashed_files, template)
+        if not template or 'sourceMappingURL' not in template:
+            return convert
+
+        def converter(matchobj):
+            # vendor CSS/JS often points at a source map that isn't shipped: leave the comment be
+            try:
+                return convert(matchobj)
+            except ValueError:
+                logger.warning('%s: source map %s not found, reference left as is', name, matchobj['url'])
+                return matchobj[0]
+        return converter
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        originals, hashed = set(self.hashed_files), set(self.hashed_files.values())
+        siblings = [sibling for name in originals | hashed for sibling in self.compress(name)]
+        now = time.time()
+        for name in hashed.union(siblings):
+            # mtime now means "in the newest manifest"; prune() counts from it
+            os.utime(self.path(name), (now, now))
+        self.prune(originals | hashed | set(siblings) | {self.manifest_name})
+
+    def compress(self, name):
+        """Write the compressed siblings of ``name`` that pay off. Returns their names."""
+        if not name.endswith(COMPRESSIBLE):
+            return []
+        path = self.path(name)
+        data = None
+        siblings = []
+        for coding in compression.encodings():
+            target = path + SUFFIXES[coding]
+            if not (os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path)):
+                if data is None:
+                    with open(path, 'rb') as fh:
+                        data = fh.read()
+                compressed = compression.compress(data, coding, best=True)
+                if len(compressed) > len(data) * (1 - self.MIN_SAVING):
+                    continue
+                with open(target, 'wb') as fh:
+                    fh.write(compressed)
+            siblings.append(name + SUFFIXES[coding])
+        return siblings
+
+    def prune(self, keep):
+        """Delete files under STATIC_ROOT that no manifest has listed for STATIC_PRUNE_DAYS. Returns their names."""
+        cutoff = time.time() - settings.STATIC_PRUNE_DAYS * 86400
+        pruned = []
+        for name in index_names(self.location):
+            path = self.path(name)
+            if name not in keep and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                pruned.append(name)
+        if pruned:
+            logger.info('Pruned %d static file(s) no longer referenced', len(pruned))
+        return pruned
+
+
+def index_names(root):
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            yield os.path.relpath(os.path.join(directory, filename), root).replace(os.sep, '/')
+
+
+@dataclass
+class StaticFile:
+    path: str
+    content_type: str
+    immutable: bool
+    # content coding -> (path, size); None is the file itself
+    variants: dict = field(default_factory=dict)
+
+
+def index(root, hashed_names):
+    """``{name: StaticFile}`` for every file under ``root``, with its compressed siblings attached."""
+    names = set(index_names(root)) if os.path.isdir(root) else set()
+    files = {}
+    for name in names:
+        if name.endswith(tuple(SUFFIXES.values())):
+            continue
+        path = os.path.join(root, name)
+        content_type, encoding = mimetypes.guess_type(name)
+        if encoding or content_type is None:
+            content_type = 'application/octet-stream'
+        elif content_type.startswith('text/') or content_type in ('application/javascript', 'image/svg+xml'):
+            content_type += '; charset=utf-8'
+        static = StaticFile(path=path, content_type=content_type, immutable=name in hashed_names)
+        static.variants[None] = (path, os.path.getsize(path))
+        for coding, suffix in SUFFIXES.items():
+            if name + suffix in names:
+                static.variants[coding] = (path + suffix, os.path.getsize(path + suffix))
+        files[name] = static
+    return files
@@ -1,6 +1,14 @@
+import hashlib
+import re
+from functools import lru_cache
+
 from django import template
+from django.conf import settings
+from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from ..conditional import templates_version
+
 register = template.Library()
 
 ICONS = {
@@ -29,6 +37,7 @@ ICONS = {
     "circle-info": '<svg class="{classes}" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.7" stroke-linecap="round" stroke-linejoin="round"><circle cx="12" cy="12" r="9"/><path d="M12 10v6"/><path d="M12 7h.01"/></svg>',
     "user-plus": '<svg class="{classes}" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.7" stroke-linecap="round" stroke-linejoin="round"><circle cx="10" cy="8" r="3.5"/><path d="M3 20c.9-2.8 3.7-4.5 7-4.5s6.1 1.7 7 4.5"/><path d="M18 8v6"/><path d="M15 11h6"/></svg>',
     "arrow-left": '<svg class="{classes}" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.7" stroke-linecap="round" stroke-linejoin="round"><path d="M5 12h14"/><path d="M11 18l-6-6 6-6"/></svg>',
+    "arrow-right": '<svg class="{classes}" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.7" stroke-linecap="round" stroke-linejoin="round"><path d="M5 12h14"/><path d="M13 6l6 6-6 6"/></svg>',
     "plus": '<svg class="{classes}" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.7" stroke-linecap="round" stroke-linejoin="round"><path d="M12 5v14"/><path d="M5 12h14"/></svg>',
     "gauge": '<svg class="{classes}" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.7" stroke-linecap="round" stroke-linejoin="round"><path d="M4 18a8 8 0 1 1 16 0"/><path d="M12 12l4 4"/><path d="M3 18h18"/></svg>',
     "logout": '<svg class="{classes}" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="1.7" stroke-linecap="round" stroke-linejoin="round"><path d="M15 5V4a2 2 0 0 0-2-2H5v20h8a2 2 0 0 0 2-2v-1"/><path d="M10 12h11"/><path d="M19 8l4 4-4 4"/></svg>',
@@ -64,9 +73,52 @@ ICONS = {
 }
 
 
-@register.simple_tag
-def icon(name, classes="h-5 w-5"):
+_SVG = re.compile(r'<svg class="\{classes\}" viewBox="([^"]+)"([^>]*)>(.*)</svg>', re.S)
+
+
+@lru_cache(maxsize=None)
+def sprite_sheet():
+    """Every icon as a <symbol id="icon-NAME">, for inline use or the icon_sprite view."""
+    symbols = []
+    for name, svg in ICONS.items():
+        view_box, attrs, body = _SVG.fullmatch(svg).groups()
+        symbols.append(f'<symbol id="icon-{name}" viewBox="{view_box}"><g{attrs}>{body}</g></symbol>')
+    return '<svg xmlns="http://www.w3.org/2000/svg" style="display:none">' + ''.join(symbols) + '</svg>'
+
+
+@lru_cache(maxsize=None)
+def sprite_version():
+    return hashlib.sha1(sprite_sheet().encode()).hexdigest()[:12]
+
+
+@lru_cache(maxsize=2048)
+def _render(name, classes, mode):
     svg = ICONS.get(name)
     if not svg:
         return ""
+    if mode == "inline":
+        return mark_safe(f'<svg class="{classes}" aria-hidden="true"><use href="#icon-{name}"/></svg>')
+    if mode == "external":
+        href = f"{reverse('icon_sprite')}?v={sprite_version()}#icon-{name}"
+        return mark_safe(f'<svg class="{classes}" aria-hidden="true"><use href="{href}"/></svg>')
     return mark_safe(svg.format(classes=classes))
+
+
+@register.simple_tag
+def icon(name, classes="h-5 w-5"):
+    # UI_ICONS_SPRITE: "" = full inline SVG, "inline" = <use> into the sheet emitted by
+    # {% icon_sprite %}, "external" = <use> into the cacheable /icons/sprite.svg
+    return _render(name, classes, settings.UI_ICONS_SPRITE)
+
+
+@register.simple_tag
+def icon_sprite():
+    if settings.UI_ICONS_SPRITE != "inline":
+        return ""
+    return mark_safe(sprite_sheet())
+
+
+@register.simple_tag
+def fragment_version():
+    # for {% cache %} keys: markup changes with the templates and with the icon mode
+    return f"{templates_version()}-{settings.UI_ICONS_SPRITE or 'svg'}"
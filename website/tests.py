@@ -1,8 +1,53 @@
+import asyncio
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import tracemalloc
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib import admin
 from django.contrib.auth.models import User
-from django.test import TestCase
-from django.urls import reverse
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.backends.sqlite3 import base as sqlite3_base
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.template.backends import django as django_backend
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+
+from . import activity, api, async_views, auth, changes, compression, counters, jobs, live, metrics, pagecache, roles, sqlite
+from .loaders import compact
+from .middleware import CompressionMiddleware, ReadReplicaMiddleware, StaticFilesMiddleware
+from .models import Counter, DailyActivity, Job, Record, RecordChange
+from .pagination import KeysetPaginator
+from .routers import ReplicaRouter, current_replica
+from .search import fts_available, search_records
+from .templatetags import ui_icons
 
-from .models import Record
+# website/urls.py with the async views routed, as under ASGI (see AsyncViewTests)
+urlpatterns = [
+    path('', async_views.home, name='home'),
+    path('dashboard', async_views.dashboard, name='dashboard'),
+    path('manage/records/<int:pk>', async_views.record_detail, name='record_detail'),
+    path('manage/records/events', async_views.record_events, name='record_events'),
+    path('admin/', admin.site.urls),
+    path('', include('website.urls')),
+]
 
 
 class RecordCrudTests(TestCase):
@@ -46,3 +91,1346 @@ class RecordCrudTests(TestCase):
         response = self.client.get(reverse('records_list'), {'q': 'launch'})
         self.assertContains(response, record_keep.title)
         self.assertNotContains(response, 'Archive')
+
+
+@override_settings(RECORDS_PAGE_SIZE=2)
+class RecordPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create_user(
+            username='staff', password='test-pass', is_staff=True
+        )
+        self.client.login(username='staff', password='test-pass')
+        now = timezone.now()
+        self.records = []
+        for i in range(5):
+            record = Record.objects.create(title=f'Record {i}', created_by=self.staff_user)
+            # two records share a timestamp so the id tie-breaker is exercised
+            Record.objects.filter(pk=record.pk).update(created_at=now - timedelta(minutes=i // 2))
+            self.records.append(record)
+
+    def test_pages_walk_forward_and_back_without_overlap(self):
+        paginator = KeysetPaginator(Record.objects.all(), per_page=2)
+        seen = []
+        page = paginator.page()
+        self.assertFalse(page.has_previous)
+        pages = [page]
+        while page.has_next:
+            page = paginator.page(after=page.next_cursor)
+            pages.append(page)
+        for page in pages:
+            seen.extend(r.pk for r in page)
+        expected = list(Record.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+        back = paginator.page(before=pages[-1].prev_cursor)
+        self.assertEqual([r.pk for r in back], [r.pk for r in pages[-2]])
+
+    def test_list_view_links_to_next_page(self):
+        response = self.client.get(reverse('records_list'))
+        page = response.context['page']
+        self.assertEqual(len(page.items), 2)
+        self.assertContains(response, f'after={page.next_cursor}')
+        self.assertEqual(response.context['total_records'], 5)
+
+        response = self.client.get(reverse('records_list'), {'after': page.next_cursor})
+        self.assertEqual(len(response.context['records']), 2)
+        self.assertTrue(response.context['page'].has_previous)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('records_list'), {'after': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page'].has_previous)
+
+
+class RecordSearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='marta', password='test-pass', is_staff=True)
+        self.client.login(username='marta', password='test-pass')
+
+    def search(self, query):
+        qs, ordering = search_records(Record.objects.all(), query)
+        return [r.title for r in qs.order_by(*ordering)]
+
+    def test_index_follows_record_and_owner_changes(self):
+        self.assertTrue(fts_available())
+        record = Record.objects.create(title='Quarterly budget', description='Numbers', created_by=self.owner)
+        self.assertEqual(self.search('budg'), ['Quarterly budget'])
+        self.assertEqual(self.search('marta'), ['Quarterly budget'])
+
+        record.title = 'Annual forecast'
+        record.save()
+        self.assertEqual(self.search('budget'), [])
+        self.assertEqual(self.search('forecast'), ['Annual forecast'])
+
+        self.owner.username = 'marta.k'
+        self.owner.save()
+        self.assertEqual(self.search('marta k'), ['Annual forecast'])
+
+        record.delete()
+        self.assertEqual(self.search('forecast'), [])
+
+    def test_title_matches_rank_above_description_matches(self):
+        Record.objects.create(title='Notes', description='mentions the roadmap once', created_by=self.owner)
+        Record.objects.create(title='Roadmap', description='Next steps', created_by=self.owner)
+        self.assertEqual(self.search('roadmap'), ['Roadmap', 'Notes'])
+
+    @override_settings(RECORDS_PAGE_SIZE=1)
+    def test_ranked_results_paginate(self):
+        for i in range(3):
+            Record.objects.create(title=f'Launch {i}', created_by=self.owner)
+        first = self.client.get(reverse('records_list'), {'q': 'launch'}).context['page']
+        second = self.client.get(reverse('records_list'), {'q': 'launch', 'after': first.next_cursor}).context['page']
+        self.assertEqual(len(first.items), 1)
+        self.assertEqual(len(second.items), 1)
+        self.assertNotEqual(first.items[0].pk, second.items[0].pk)
+
+
+class SiteCounterTests(TestCase):
+    def test_counters_follow_creates_and_deletes(self):
+        user = User.objects.create_user(username='ana', password='test-pass')
+        record = Record.objects.create(title='One', created_by=user)
+        Record.objects.create(title='Two', created_by=user)
+        stats = counters.site_stats()
+        self.assertEqual(stats['total_users'], 1)
+        self.assertEqual(stats['total_records'], 2)
+        self.assertEqual(stats['new_users_week'], 1)
+        self.assertEqual(stats['active_24h'], 0)
+
+        record.delete()
+        user.delete()
+        stats = counters.site_stats()
+        self.assertEqual(stats['total_users'], 0)
+        self.assertEqual(stats['total_records'], 1)
+        self.assertEqual(stats['new_users_week'], 0)
+
+    def test_login_moves_user_between_activity_buckets(self):
+        User.objects.create_user(username='ana', password='test-pass')
+        self.client.login(username='ana', password='test-pass')
+        self.assertEqual(counters.site_stats()['active_24h'], 1)
+
+        user = User.objects.get(username='ana')
+        user.last_login = timezone.now() - timedelta(days=3)
+        user.save()
+        self.assertEqual(counters.site_stats()['active_24h'], 0)
+        self.client.login(username='ana', password='test-pass')
+        self.assertEqual(counters.site_stats()['active_24h'], 1)
+
+    def test_rebuild_repairs_drift_from_bulk_writes(self):
+        Record.objects.bulk_create(Record(title=f'Bulk {i}') for i in range(3))
+        self.assertEqual(counters.site_stats()['total_records'], 0)
+        counters.rebuild()
+        self.assertEqual(counters.site_stats()['total_records'], 3)
+
+    def test_dashboard_reads_counters_not_user_table(self):
+        user = User.objects.create_user(username='ana', password='test-pass')
+        self.client.force_login(user)
+        Counter.objects.filter(key=counters.TOTAL_USERS).update(value=42)
+        response = self.client.get(reverse('dashboard'))
+        self.assertIn(42, [stat['value'] for stat in response.context['stats']])
+
+
+class RecordExportTests(TestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.client.login(username='staff', password='test-pass')
+
+    def export(self, **params):
+        response = self.client.get(reverse('records_export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_respects_search(self):
+        Record.objects.create(title='Launch Plan', description='Q1, rollout', created_by=self.staff_user)
+        Record.objects.create(title='Archive', created_by=self.staff_user)
+        rows = list(csv.reader(io.StringIO(self.export(q='launch'))))
+        self.assertEqual(rows[0][:3], ['id', 'title', 'description'])
+        self.assertEqual([row[1:4] for row in rows[1:]], [['Launch Plan', 'Q1, rollout', 'staff']])
+
+    def test_ndjson_export(self):
+        Record.objects.create(title='Launch Plan', created_by=self.staff_user)
+        lines = self.export(format='ndjson').splitlines()
+        self.assertEqual(json.loads(lines[0])['title'], 'Launch Plan')
+
+    def test_export_requires_staff(self):
+        User.objects.create_user(username='member', password='test-pass')
+        self.client.login(username='member', password='test-pass')
+        response = self.client.get(reverse('records_export'))
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(RECORDS_EXPORT_CHUNK_SIZE=200)
+    def test_export_memory_is_flat_in_table_size(self):
+        def peak_for(total):
+            Record.objects.all().delete()
+            Record.objects.bulk_create(
+                Record(title=f'Row {i}', description='lorem ipsum ' * 20, created_by=self.staff_user)
+                for i in range(total)
+            )
+            response = self.client.get(reverse('records_export'))
+            tracemalloc.start()
+            try:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+                return size, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        small_size, small_peak = peak_for(1000)
+        large_size, large_peak = peak_for(10000)
+        self.assertGreater(large_size, small_size * 9)
+        # 10x the rows, but the peak is bounded by the chunk size, not the table
+        self.assertLess(large_peak, small_peak * 2)
+        self.assertLess(large_peak, large_size)
+
+
+class ImportRecordsCommandTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='ana', password='test-pass')
+        handle, self.path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(['title', 'description', 'created_by'])
+            writer.writerow(['First', 'One', 'ana'])
+            writer.writerow(['', 'Missing title', 'ana'])
+            writer.writerow(['Second', '', 'ghost'])
+            writer.writerow(['Third', 'Three', ''])
+            writer.writerow(['Fourth', 'Four', 'ana'])
+        self.addCleanup(os.remove, self.path)
+
+    def run_import(self, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_records', self.path, '--batch-size', '2', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_imports_valid_rows_and_reports_invalid_ones(self):
+        out, err = self.run_import()
+        self.assertEqual(
+            list(Record.objects.order_by('id').values_list('title', 'created_by__username')),
+            [('First', 'ana'), ('Third', None), ('Fourth', 'ana')],
+        )
+        self.assertIn('row 2: title:', err)
+        self.assertIn("row 3: unknown user 'ghost'", err)
+        self.assertIn('Imported 3 records, skipped 2 invalid rows', out)
+        self.assertEqual(counters.value(counters.TOTAL_RECORDS), 3)
+
+    def test_checkpoint_resumes_after_committed_rows(self):
+        # pretend an earlier run committed the first two batches before failing
+        counters.bump('import.checkpoint:nightly', 4)
+        self.run_import('--checkpoint', 'nightly')
+        self.assertEqual(list(Record.objects.values_list('title', flat=True)), ['Fourth'])
+
+        self.run_import('--checkpoint', 'nightly')
+        self.assertEqual(Record.objects.count(), 1)
+        self.run_import('--checkpoint', 'nightly', '--restart')
+        self.assertEqual(Record.objects.count(), 4)
+
+
+class QueryPlanTests(TestCase):
+    """Every SELECT a page issues must be answered from an index, never a full table scan."""
+
+    FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='root', password='test-pass', is_staff=True, is_superuser=True
+        )
+        for i in range(30):
+            Record.objects.create(title=f'Launch step {i}', description='Details', created_by=cls.admin)
+
+    def assert_indexed(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        for query in ctx.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = [row[3] for row in cursor.fetchall()]
+            scans = [step for step in plan if self.FULL_SCAN.match(step)]
+            self.assertFalse(scans, f"{url}: full scan in {query['sql']}\n{plan}")
+
+    def test_public_and_member_pages(self):
+        self.assert_indexed(reverse('home'))
+        self.client.force_login(self.admin)
+        self.assert_indexed(reverse('home'))
+        self.assert_indexed(reverse('dashboard'))
+
+    def test_records_pages(self):
+        self.client.force_login(self.admin)
+        self.assert_indexed(reverse('records_list'))
+        self.assert_indexed(reverse('records_list'), {'q': 'launch'})
+        page = self.client.get(reverse('records_list')).context['page']
+        self.assert_indexed(reverse('records_list'), {'after': page.next_cursor})
+        self.assert_indexed(reverse('records_list'), {'before': page.next_cursor})
+        self.assert_indexed(reverse('record_detail', args=[Record.objects.first().pk]))
+        self.assert_indexed(reverse('records_export'))
+
+    def test_user_admin_pages(self):
+        self.client.force_login(self.admin)
+        self.assert_indexed(reverse('admin_users'))
+        self.assert_indexed(reverse('admin_users'), {'q': 'ro'})
+        for sort in ('username', '-last_login', 'date_joined'):
+            self.assert_indexed(reverse('admin_users'), {'sort': sort})
+
+
+class AdminUsersTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='root', password='test-pass', is_staff=True)
+        now = timezone.now()
+        for i in range(5):
+            user = User.objects.create_user(username=f'member{i}', email=f'M{i}@example.com')
+            User.objects.filter(pk=user.pk).update(date_joined=now - timedelta(days=i))
+        cls.busy = User.objects.get(username='member3')
+        for i in range(3):
+            Record.objects.create(title=f'Record {i}', created_by=cls.busy)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    @override_settings(USERS_PAGE_SIZE=2)
+    def test_pages_cover_every_user_once(self):
+        seen, params = [], {'sort': 'username'}
+        while True:
+            response = self.client.get(reverse('admin_users'), params)
+            page = response.context['page']
+            seen.extend(u.username for u in page)
+            if not page.has_next:
+                break
+            self.assertContains(response, f'after={page.next_cursor}')
+            params['after'] = page.next_cursor
+        self.assertEqual(seen, sorted(User.objects.values_list('username', flat=True)))
+
+    def test_record_counts_are_annotated_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin_users'))
+        counts = {u.username: u.record_count for u in response.context['users']}
+        self.assertEqual(counts['member3'], 3)
+        self.assertEqual(counts['member0'], 0)
+        record_queries = [q for q in ctx.captured_queries if 'website_record' in q['sql']]
+        self.assertEqual(len(record_queries), 1)
+
+    def test_search_matches_username_or_email_prefix(self):
+        response = self.client.get(reverse('admin_users'), {'q': 'MEMBER1'})
+        self.assertEqual([u.username for u in response.context['users']], ['member1'])
+        response = self.client.get(reverse('admin_users'), {'q': 'm2@'})
+        self.assertEqual([u.username for u in response.context['users']], ['member2'])
+        response = self.client.get(reverse('admin_users'), {'q': 'ember'})
+        self.assertEqual(list(response.context['users']), [])
+
+    def test_search_folds_case_like_sqlite(self):
+        User.objects.create_user(username='Élan')
+        response = self.client.get(reverse('admin_users'), {'q': 'ÉL'})
+        self.assertEqual([u.username for u in response.context['users']], ['Élan'])
+
+    def test_sort_orders(self):
+        response = self.client.get(reverse('admin_users'), {'sort': 'date_joined'})
+        self.assertEqual(response.context['users'][0].username, 'member4')
+        response = self.client.get(reverse('admin_users'), {'sort': 'bogus'})
+        self.assertEqual(response.context['sort'], '-date_joined')
+
+
+class BulkRoleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='root', password='test-pass')
+        self.members = [User.objects.create_user(username=f'member{i}') for i in range(4)]
+        self.client.force_login(self.admin)
+
+    def post(self, action, users):
+        return self.client.post(reverse('admin_users_roles'), {'action': action, 'user_ids': [u.pk for u in users]})
+
+    def test_grant_is_one_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.post('grant_superuser', self.members)
+        self.assertRedirects(response, reverse('admin_users'), fetch_redirect_response=False)
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "auth_user"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(User.objects.filter(is_superuser=True, is_staff=True).count(), 5)
+
+    def test_actor_is_never_changed(self):
+        self.post('revoke_superuser', [self.admin, *self.members])
+        self.admin.refresh_from_db()
+        self.assertTrue(self.admin.is_superuser)
+
+    def test_last_superuser_is_kept(self):
+        other = self.members[0]
+        User.objects.filter(pk=other.pk).update(is_superuser=True)
+        # the actor was demoted concurrently: no superuser outside the batch remains
+        User.objects.filter(pk=self.admin.pk).update(is_superuser=False)
+        self.assertEqual(roles.change_roles(self.admin, [other.pk], 'revoke_superuser'), 0)
+        self.assertTrue(User.objects.get(pk=other.pk).is_superuser)
+
+    def test_cached_users_are_forgotten(self):
+        member = self.members[0]
+        User.objects.filter(pk=member.pk).update(is_staff=True)
+        member_client = self.client_class()
+        member_client.force_login(User.objects.get(pk=member.pk))
+        with override_settings(AUTH_USER_CACHE_TIMEOUT=60):
+            self.assertEqual(member_client.get(reverse('records_list')).status_code, 200)
+            self.post('revoke_staff', [member])
+            self.assertEqual(member_client.get(reverse('records_list')).status_code, 302)
+
+    def test_staff_cannot_change_roles(self):
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.post('grant_superuser', [staff, *self.members])
+        self.assertFalse(User.objects.filter(is_superuser=True).exclude(pk=self.admin.pk).exists())
+
+
+class RecordCardCacheTests(TestCase):
+    def setUp(self):
+        caches['fragments'].clear()
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.client.login(username='staff', password='test-pass')
+        self.record = Record.objects.create(title='Cached card', created_by=self.staff_user)
+
+    def card_key(self, record):
+        version = ui_icons.fragment_version()
+        return make_template_fragment_key('record_card', [version, record.pk, record.updated_at, record.created_by])
+
+    def test_list_caches_each_card(self):
+        self.client.get(reverse('records_list'))
+        self.assertIn('Cached card', caches['fragments'].get(self.card_key(self.record)))
+
+    def test_update_renders_a_fresh_card(self):
+        self.client.get(reverse('records_list'))
+        self.client.post(
+            reverse('record_update', args=[self.record.pk]),
+            {'title': 'Renamed card', 'description': ''},
+        )
+        response = self.client.get(reverse('records_list'))
+        self.assertContains(response, 'Renamed card')
+        self.assertNotContains(response, 'Cached card')
+
+    def test_icon_mode_switch_renders_fresh_cards(self):
+        self.client.get(reverse('records_list'))
+        with override_settings(UI_ICONS_SPRITE='external'):
+            self.client.get(reverse('records_list'))
+            card = caches['fragments'].get(self.card_key(self.record))
+        self.assertIn(reverse('icon_sprite'), card)
+
+
+class IconTagTests(TestCase):
+    def test_full_svg_is_memoized(self):
+        first = ui_icons.icon('plus', 'h-4 w-4')
+        self.assertIn('class="h-4 w-4"', first)
+        self.assertIs(ui_icons.icon('plus', 'h-4 w-4'), first)
+        self.assertEqual(ui_icons.icon('no-such-icon'), '')
+
+    @override_settings(UI_ICONS_SPRITE='inline')
+    def test_inline_sprite_mode(self):
+        self.assertEqual(
+            ui_icons.icon('plus', 'h-4 w-4'),
+            '<svg class="h-4 w-4" aria-hidden="true"><use href="#icon-plus"/></svg>',
+        )
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '<symbol id="icon-plus"', count=1)
+        self.assertContains(response, 'href="#icon-rocket"')
+
+    @override_settings(UI_ICONS_SPRITE='external')
+    def test_external_sprite_is_versioned_and_cacheable(self):
+        self.assertIn(f'/icons/sprite.svg?v={ui_icons.sprite_version()}#icon-plus', ui_icons.icon('plus'))
+        response = self.client.get(reverse('icon_sprite'))
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertContains(response, '<symbol id="icon-plus"')
+        self.assertNotContains(self.client.get(reverse('home')), '<symbol')
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.client.login(username='staff', password='test-pass')
+        Record.objects.create(title='Measured', created_by=self.staff_user)
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.get(reverse('records_list'))
+        self.client.get(reverse('records_list'))
+        stats = metrics.registry.snapshot()['records_list']
+        self.assertEqual(stats['request_ms'].count, 2)
+        self.assertGreater(stats['queries'].sum, 0)
+        self.assertGreater(stats['db_ms'].sum, 0)
+        self.assertGreater(stats['template_ms'].sum, 0)
+
+    def test_template_timing_comes_from_the_configured_backend(self):
+        self.client.get(reverse('records_list'))
+        self.assertIsInstance(engines['django'], metrics.DjangoTemplates)
+        # Django's own backend class stays unpatched for everything else in the process
+        self.assertEqual(django_backend.Template.render.__module__, 'django.template.backends.django')
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_skipped(self):
+        self.client.get(reverse('records_list'))
+        self.assertEqual(metrics.registry.snapshot(), {})
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_requests_log_their_queries(self):
+        with self.assertLogs('website.metrics', 'WARNING') as logs:
+            self.client.get(reverse('records_list'))
+        self.assertIn('records_list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_histogram_quantiles(self):
+        hist = metrics.Histogram(metrics.TIME_BUCKETS_MS)
+        for value in [3] * 90 + [40] * 9 + [20000]:
+            hist.observe(value)
+        self.assertEqual(hist.quantile(0.5), 5)
+        self.assertEqual(hist.quantile(0.95), 50)
+        self.assertEqual(hist.quantile(1), float('inf'))
+
+    def test_staff_metrics_page(self):
+        self.client.get(reverse('records_list'))
+        response = self.client.get(reverse('metrics_overview'))
+        self.assertContains(response, 'records_list')
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics_overview')).status_code, 302)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_prometheus_endpoint(self):
+        self.client.get(reverse('records_list'))
+        self.client.logout()
+        url = reverse('metrics_prometheus')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertContains(response, 'crud_request_ms_count{view="records_list"} 1')
+        self.assertContains(response, 'crud_queries_bucket{view="records_list",le="+Inf"} 1')
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncViewTests(TransactionTestCase):
+    # the async views read on pool threads with their own connections, which only see committed rows
+    databases = '__all__'  # replica aliases too, when DJANGO_READ_REPLICAS is set
+    def setUp(self):
+        metrics.registry.reset()
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.record = Record.objects.create(title='Async record', created_by=self.staff_user)
+        self.client = AsyncClient()
+
+    async def test_home(self):
+        response = await self.client.get(reverse('home'))
+        self.assertContains(response, 'Async record')
+        self.assertContains(response, 'Sign in')
+
+    async def test_dashboard_requires_login(self):
+        response = await self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('dashboard')}", fetch_redirect_response=False)
+
+    async def test_staff_dashboard_and_detail(self):
+        await sync_to_async(self.client.force_login)(self.staff_user)
+        response = await self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Async record')
+        response = await self.client.get(reverse('record_detail', args=[self.record.pk]))
+        self.assertContains(response, 'Async record')
+        revalidated = await self.client.get(
+            reverse('record_detail', args=[self.record.pk]), headers={'If-None-Match': response['ETag']}
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        response = await self.client.get(reverse('record_detail', args=[self.record.pk + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_read_threads_keep_their_connections(self):
+        # the in-memory test database ignores close(), so count the calls rather than reconnects
+        backend = type(connections['default'])
+        close = backend.close
+        closed = []
+
+        def counting_close(conn):
+            closed.append(conn.alias)
+            close(conn)
+        with mock.patch.object(backend, 'close', counting_close):
+            for _ in range(20):
+                await async_views.gather_reads(lambda: Record.objects.count(), lambda: Record.objects.exists())
+        self.assertEqual(closed, [])
+        self.assertLessEqual(len(async_views._read_pool()._threads), settings.ASYNC_READ_THREADS)
+
+    async def test_queries_on_pool_threads_are_measured(self):
+        await self.client.get(reverse('home'))
+        stats = metrics.registry.snapshot()['home']
+        self.assertEqual(stats['request_ms'].count, 1)
+        self.assertGreaterEqual(stats['queries'].sum, 2)
+
+
+class SqliteProfileTests(TransactionTestCase):
+    @override_settings(SQLITE_PROFILE='production')
+    def test_production_pragmas_and_immediate_transactions(self):
+        conn = connections.create_connection('default')
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('PRAGMA busy_timeout')
+                self.assertEqual(cursor.fetchone()[0], 5000)
+                cursor.execute('PRAGMA synchronous')
+                self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            with CaptureQueriesContext(conn) as ctx:
+                # what transaction.atomic() does on entry
+                conn.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+            conn.rollback()
+            conn.set_autocommit(True)
+            self.assertEqual(ctx.captured_queries[0]['sql'], 'BEGIN IMMEDIATE')
+        finally:
+            conn.close()
+
+    def test_django_still_has_the_transaction_hook(self):
+        # website.sqlite_backend overrides this private method; fail loudly if an upgrade drops it
+        self.assertTrue(callable(getattr(sqlite3_base.DatabaseWrapper, '_start_transaction_under_autocommit', None)))
+
+    def test_default_profile_leaves_connections_alone(self):
+        conn = connections.create_connection('default')
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('PRAGMA cache_size')
+                self.assertNotEqual(cursor.fetchone()[0], -64000)
+        finally:
+            conn.close()
+
+    def test_retry_on_locked(self):
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        self.assertEqual(sqlite.retry_on_locked(flaky, backoff=0)(), 'done')
+        self.assertEqual(len(calls), 3)
+
+        def broken():
+            raise OperationalError('no such table: nope')
+
+        with self.assertRaises(OperationalError):
+            sqlite.retry_on_locked(broken, backoff=0)()
+
+    def test_no_retry_inside_an_outer_transaction(self):
+        calls = []
+
+        def locked():
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        with transaction.atomic(), self.assertRaises(OperationalError):
+            sqlite.retry_on_locked(locked, backoff=0)()
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(READ_REPLICAS=['replica1', 'replica2'], READ_REPLICA_PIN_SECONDS=5)
+class ReadReplicaTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.session = {}
+        self.seen = []
+
+        def view(request):
+            self.seen.append(self.router.db_for_read(Record))
+            return HttpResponse()
+
+        self.middleware = ReadReplicaMiddleware(view)
+
+    def request(self, method='get'):
+        request = getattr(RequestFactory(), method)('/')
+        request.session = self.session
+        self.middleware(request)
+        return self.seen[-1]
+
+    def test_router_outside_requests_uses_primary(self):
+        self.assertEqual(self.router.db_for_read(Record), 'default')
+        token = current_replica.set('replica1')
+        try:
+            self.assertEqual(self.router.db_for_read(Record), 'replica1')
+            self.assertEqual(self.router.db_for_write(Record), 'default')
+        finally:
+            current_replica.reset(token)
+        self.assertFalse(self.router.allow_migrate('replica1', 'website'))
+        self.assertIsNone(self.router.allow_migrate('default', 'website'))
+
+    def test_reads_go_to_replicas(self):
+        self.assertIn(self.request(), ['replica1', 'replica2'])
+        self.assertIsNone(current_replica.get())
+
+    def test_session_reads_its_own_writes(self):
+        self.assertEqual(self.request('post'), 'default')
+        self.assertEqual(self.request(), 'default')
+        self.session[ReadReplicaMiddleware.PIN_KEY] -= 10
+        self.assertIn(self.request(), ['replica1', 'replica2'])
+
+    @override_settings(READ_REPLICAS=[])
+    def test_disabled_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReadReplicaMiddleware(lambda request: HttpResponse())
+
+
+class RecordApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.records = [
+            Record.objects.create(title=f'Record {i}', description='body', created_by=self.staff_user)
+            for i in range(5)
+        ]
+        self.url = reverse('api_records')
+
+    def basic(self, username='staff', password='test-pass'):
+        token = base64.b64encode(f'{username}:{password}'.encode()).decode()
+        return {'HTTP_AUTHORIZATION': f'Basic {token}'}
+
+    def post(self, payload, **extra):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json', **extra)
+
+    def test_requires_staff(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url, **self.basic(password='wrong')).status_code, 401)
+        User.objects.create_user(username='member', password='test-pass')
+        self.assertEqual(self.client.get(self.url, **self.basic('member')).status_code, 403)
+
+    def test_basic_auth_check_is_cached_until_the_user_changes(self):
+        self.assertEqual(self.client.get(self.url, **self.basic()).status_code, 200)
+        # behind the model's back: no signal, so the cached check still answers
+        User.objects.filter(pk=self.staff_user.pk).update(password='!')
+        self.assertEqual(self.client.get(self.url, **self.basic()).status_code, 200)
+        auth.forget_users(self.staff_user.pk)
+        self.assertEqual(self.client.get(self.url, **self.basic()).status_code, 401)
+
+        self.staff_user.set_password('test-pass')
+        self.staff_user.save()
+        self.assertEqual(self.client.get(self.url, **self.basic()).status_code, 200)
+        self.staff_user.set_password('new-pass')
+        self.staff_user.save()
+        self.assertEqual(self.client.get(self.url, **self.basic()).status_code, 401)
+        self.assertEqual(self.client.get(self.url, **self.basic(password='new-pass')).status_code, 200)
+
+    def test_session_writes_need_csrf(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        client.force_login(self.staff_user)
+        self.assertEqual(client.get(self.url).status_code, 200)
+        response = client.post(self.url, '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_list_selects_fields_and_pages_with_a_cursor(self):
+        response = self.client.get(self.url, {'fields': 'id,title', 'limit': 3}, **self.basic())
+        body = response.json()
+        self.assertEqual(body['results'], [{'id': r.pk, 'title': r.title} for r in self.records[:-4:-1]])
+        body = self.client.get(self.url, {'fields': 'id', 'limit': 3, 'after': body['next']}, **self.basic()).json()
+        self.assertEqual([row['id'] for row in body['results']], [r.pk for r in self.records[1::-1]])
+        self.assertIsNone(body['next'])
+        self.assertEqual(self.client.get(self.url, {'fields': 'password'}, **self.basic()).status_code, 400)
+
+    def test_list_rejects_cursors_it_did_not_make(self):
+        first = self.client.get(self.url, {'limit': 2}, **self.basic()).json()
+        searched = self.client.get(self.url, {'limit': 2, 'q': 'record'}, **self.basic()).json()
+        self.assertIsNotNone(searched['next'])
+        for params in ({'after': 'not-a-cursor'}, {'after': searched['next']}, {'q': 'record', 'after': first['next']}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, {'limit': 2, **params}, **self.basic())
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], 'Invalid cursor.')
+
+    def test_batch_create_update_delete(self):
+        keep, change, drop = self.records[:3]
+        with self.assertNumQueries(12):
+            response = self.post({
+                'create': [{'title': 'New one'}, {'title': 'New two', 'description': 'x'}],
+                'update': [{'id': change.pk, 'title': 'Changed'}],
+                'delete': [drop.pk],
+            }, **self.basic())
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual(len(body['created']), 2)
+        self.assertEqual(Record.objects.get(pk=body['created'][0]).created_by, self.staff_user)
+        change.refresh_from_db()
+        self.assertEqual((change.title, change.description), ('Changed', 'body'))
+        self.assertGreater(change.updated_at, keep.updated_at)
+        self.assertFalse(Record.objects.filter(pk=drop.pk).exists())
+        self.assertEqual(counters.value(counters.TOTAL_RECORDS), 6)
+
+    def test_batch_updates_merge_over_concurrent_writes(self):
+        edited, gone = self.records[:2]
+        update = api._update
+
+        def racing(changed, now):
+            # another writer, between validation and the batch's transaction
+            Record.objects.filter(pk=edited.pk).update(description='edited meanwhile')
+            Record.objects.filter(pk=gone.pk).delete()
+            return update(changed, now)
+        with mock.patch.object(api, '_update', racing):
+            response = self.post({
+                'update': [{'id': edited.pk, 'title': 'Renamed'}, {'id': gone.pk, 'title': 'Too late'}],
+            }, **self.basic())
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['updated'], [edited.pk])
+        edited.refresh_from_db()
+        self.assertEqual((edited.title, edited.description), ('Renamed', 'edited meanwhile'))
+        self.assertFalse(Record.objects.filter(pk=gone.pk).exists())
+
+    def test_batch_is_all_or_nothing(self):
+        response = self.post({
+            'create': [{'title': 'Fine'}, {'title': ''}],
+            'update': [{'id': 999999, 'title': 'Ghost'}],
+            'delete': [self.records[0].pk],
+        }, **self.basic())
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([(e['op'], e['index']) for e in errors], [('create', 1), ('update', 0)])
+        self.assertIn('title', errors[0]['errors'])
+        self.assertEqual(Record.objects.count(), 5)
+
+    def test_batch_rejects_ids_that_are_not_integers(self):
+        for payload in (
+            {'delete': [[1]]},
+            {'delete': [{'a': 1}]},
+            {'delete': [True]},
+            {'delete': ['1']},
+            {'update': [{'id': [1], 'title': 'x'}]},
+            {'update': [{'id': True, 'title': 'x'}]},
+        ):
+            with self.subTest(payload=payload):
+                response = self.post(payload, **self.basic())
+                self.assertEqual(response.status_code, 400)
+                [error] = response.json()['errors']
+                self.assertEqual(error['errors'], {'id': ['Expected an integer record id.']})
+        self.assertEqual(Record.objects.count(), 5)
+
+    def test_batch_duplicate_ids(self):
+        first, second = self.records[:2]
+        response = self.post({'delete': [first.pk, first.pk]}, **self.basic())
+        self.assertEqual(response.json()['deleted'], [first.pk])
+        response = self.post({'update': [{'id': second.pk, 'title': 'a'}, {'id': second.pk, 'title': 'b'}]}, **self.basic())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.json()['errors']], [1])
+
+
+class RecordChangeFeedTests(TestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.client.force_login(self.staff_user)
+        self.url = reverse('api_record_changes')
+
+    def feed(self, since, **params):
+        response = self.client.get(self.url, {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return [json.loads(line) for line in lines], int(response['X-Changes-Cursor'])
+
+    def test_feed_follows_views_and_bulk_paths(self):
+        cursor = int(self.client.get(reverse('api_records'))['X-Changes-Cursor'])
+        self.client.post(reverse('record_create'), {'title': 'Made', 'description': ''})
+        made = Record.objects.get(title='Made')
+        self.client.post(reverse('record_update', args=[made.pk]), {'title': 'Renamed', 'description': ''})
+        other = Record.objects.create(title='Doomed')
+        self.client.post(reverse('record_delete', args=[other.pk]))
+
+        events, cursor = self.feed(cursor, fields='id,title')
+        self.assertEqual(
+            [(e['op'], e['id']) for e in events],
+            [('create', made.pk), ('update', made.pk), ('delete', other.pk)],
+        )
+        # rows are served as they are now; the deleted record's create is skipped
+        self.assertEqual(events[0]['record'], {'id': made.pk, 'title': 'Renamed'})
+        self.assertIsNone(events[-1]['record'])
+        self.assertEqual(cursor, events[-1]['cursor'])
+
+        self.client.post(reverse('api_records'), json.dumps({'create': [{'title': 'Bulk'}], 'delete': [made.pk]}),
+                         content_type='application/json')
+        events, cursor = self.feed(cursor)
+        self.assertEqual([e['op'] for e in events], ['create', 'delete'])
+        self.assertEqual(self.feed(cursor), ([], cursor))
+
+    def test_compaction_keeps_latest_event_and_refuses_stale_cursors(self):
+        record = Record.objects.create(title='v1')
+        for title in ('v2', 'v3'):
+            record.title = title
+            record.save()
+        fresh = Record.objects.create(title='fresh')
+        self.assertEqual(changes.compact(timedelta(days=30)), (2, 0))
+        events, _ = self.feed(0)
+        self.assertEqual([(e['op'], e['id']) for e in events], [('update', record.pk), ('create', fresh.pk)])
+
+        RecordChange.objects.filter(record_id=record.pk).update(at=timezone.now() - timedelta(days=31))
+        out = io.StringIO()
+        call_command('compact_changes', stdout=out)
+        self.assertIn('1 expired', out.getvalue())
+        response = self.client.get(self.url, {'since': 0})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.json()['horizon'], changes.horizon())
+        events, _ = self.feed(changes.horizon())
+        self.assertEqual([e['id'] for e in events], [fresh.pk])
+
+    def test_rejects_malformed_cursors(self):
+        RecordChange.objects.create(record_id=1, op=changes.CREATE)
+        for since in ('-5', 'abc', '1.5'):
+            with self.subTest(since=since):
+                self.assertEqual(self.client.get(self.url, {'since': since}).status_code, 400)
+
+
+class LiveEventsTests(TransactionTestCase):
+    # streams are read straight from the view: AsyncClient would wait for the endless body
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+
+    def stream_request(self, **headers):
+        request = RequestFactory().get('/manage/records/events', headers=headers)
+        request.user = self.staff_user
+        return request
+
+    async def open_stream(self, **headers):
+        response = await async_views.record_events(self.stream_request(**headers))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        return stream
+
+    async def test_committed_changes_reach_open_streams(self):
+        stream = await self.open_stream()
+        record = await sync_to_async(Record.objects.create)(title='Live')
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        cursor = await sync_to_async(changes.head)()
+        self.assertEqual(chunk, f'id: {cursor}\nevent: record\ndata: {{"op": "create", "id": {record.pk}}}\n\n'.encode())
+        await sync_to_async(record.delete)()
+        self.assertIn(b'"op": "delete"', await asyncio.wait_for(anext(stream), 5))
+
+    async def test_reconnect_replays_from_the_change_log(self):
+        cursor = await sync_to_async(changes.head)()
+        record = await sync_to_async(Record.objects.create)(title='Missed')
+        stream = await self.open_stream(**{'Last-Event-ID': str(cursor)})
+        self.assertIn(f'"id": {record.pk}'.encode(), await anext(stream))
+
+        await sync_to_async(Counter.objects.create)(key=changes.HORIZON, value=cursor + 1)
+        stream = await self.open_stream(**{'Last-Event-ID': str(cursor)})
+        self.assertTrue((await anext(stream)).startswith(b'event: reload'))
+
+    async def test_idle_streams_hold_bounded_memory(self):
+        broker, received = live.broker(), []
+
+        async def hold():
+            stream = await self.open_stream()
+            async for chunk in stream:
+                received.append(chunk)
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            tasks = [asyncio.ensure_future(hold()) for _ in range(1000)]
+            while broker.subscriber_count() < 1000:
+                await asyncio.sleep(0.01)
+            per_stream = (tracemalloc.get_traced_memory()[0] - before) / 1000
+        finally:
+            tracemalloc.stop()
+        self.assertLess(per_stream, 16 * 1024)
+
+        live.publish([{'cursor': 10 ** 9, 'op': 'update', 'id': 1}])
+        while len(received) < 1000:
+            await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_wsgi_and_non_staff(self):
+        self.client.force_login(self.staff_user)
+        self.assertEqual(self.client.get(reverse('record_events')).status_code, 204)
+        member = User.objects.create_user(username='member')
+        request = self.stream_request()
+        request.user = member
+        response = async_to_sync(async_views.record_events)(request)
+        self.assertEqual(response.status_code, 403)
+
+    def test_card_fragment(self):
+        record = Record.objects.create(title='Patched', created_by=self.staff_user)
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('record_card', args=[record.pk]))
+        self.assertContains(response, 'Patched')
+        self.assertNotContains(response, '<html')
+        page = self.client.get(reverse('records_list'))
+        self.assertContains(page, f'id="record-{record.pk}"')
+
+
+class JobQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.client.force_login(self.staff_user)
+
+    def test_view_enqueues_and_worker_runs(self):
+        owner = User.objects.create_user(username='owner')
+        Record.objects.bulk_create(Record(title=f'r{i}', created_by=owner) for i in range(7))
+        Record.objects.create(title='keep')
+        response = self.client.post(reverse('admin_user_delete_records', args=[owner.pk]))
+        self.assertRedirects(response, reverse('jobs_list'), fetch_redirect_response=False)
+        # the request only queued the work
+        self.assertEqual(Record.objects.count(), 8)
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.status, job.args), ('delete_records', Job.QUEUED, {'owner': owner.pk}))
+
+        out = io.StringIO()
+        call_command('run_worker', '--once', '--threads', '1', stdout=out)
+        self.assertIn('after 1 job', out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.DONE, {'deleted': 7}))
+        self.assertEqual(list(Record.objects.values_list('title', flat=True)), ['keep'])
+        self.assertContains(self.client.get(reverse('jobs_list')), 'delete_records')
+
+    def test_claims_are_exclusive_and_leases_expire(self):
+        job = jobs.enqueue('rebuild_counters')
+        self.assertEqual(jobs.claim('a').pk, job.pk)
+        self.assertIsNone(jobs.claim('b'))
+        later = timezone.now() + timedelta(seconds=settings.JOBS_LEASE_SECONDS + 1)
+        reclaimed = jobs.claim('b', now=later)
+        self.assertEqual((reclaimed.claimed_by, reclaimed.attempts), ('b', 2))
+        # the first worker's claim is stale: its outcome is not recorded
+        job.refresh_from_db()
+        job.claimed_by, job.attempts = 'a', 1
+        jobs.run(job)
+        self.assertEqual(Job.objects.get().status, Job.RUNNING)
+
+    def test_failures_back_off_then_fail(self):
+        @jobs.task
+        def flaky():
+            raise ValueError('boom')
+        self.addCleanup(jobs.tasks.pop, 'flaky')
+
+        job = jobs.enqueue('flaky', max_attempts=2)
+        with self.assertLogs('website.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(jobs.claim('w')), Job.QUEUED)
+        job.refresh_from_db()
+        self.assertIn('ValueError: boom', job.error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=settings.JOBS_RETRY_BACKOFF * 0.8))
+        self.assertIsNone(jobs.claim('w'))
+
+        retry = jobs.claim('w', now=job.run_after)
+        with self.assertLogs('website.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(retry), Job.FAILED)
+        self.assertEqual(Job.objects.get().attempts, 2)
+
+    def test_jobs_page_is_staff_only_and_queues_maintenance(self):
+        self.client.post(reverse('jobs_list'), {'name': 'rebuild_counters'})
+        self.client.post(reverse('jobs_list'), {'name': 'os.system'})
+        self.assertEqual(list(Job.objects.values_list('name', flat=True)), ['rebuild_counters'])
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('jobs_list')).status_code, 302)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.client.force_login(self.staff_user)
+        self.record = Record.objects.create(title='Stable', created_by=self.staff_user)
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(url, params, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_detail_not_modified_until_the_record_changes(self):
+        url = reverse('record_detail', args=[self.record.pk])
+        first = self.client.get(url)
+        self.assertIn('no-cache', first['Cache-Control'])
+        self.assertIn('Last-Modified', first)
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertFalse(second.templates)
+
+        Record.objects.filter(pk=self.record.pk).update(updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_etag_depends_on_the_viewer(self):
+        url = reverse('record_detail', args=[self.record.pk])
+        first = self.client.get(url)
+        other = User.objects.create_user(username='other', password='test-pass', is_staff=True)
+        self.client.force_login(other)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_pending_messages_force_a_render(self):
+        url = reverse('record_detail', args=[self.record.pk])
+        first = self.client.get(url)
+        response = self.client.post(
+            reverse('record_update', args=[self.record.pk]), {'title': 'Stable', 'description': ''}
+        )
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        with_message = self.revalidate(url, first)
+        self.assertContains(with_message, 'Record updated.')
+        self.assertNotIn('ETag', with_message)
+
+    def test_list_fingerprint(self):
+        url = reverse('records_list')
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        searched = self.client.get(url, {'q': 'stable'})
+        self.assertNotEqual(searched['ETag'], first['ETag'])
+        self.assertEqual(self.revalidate(url, searched, q='stable').status_code, 304)
+
+        Record.objects.create(title='Another', created_by=self.staff_user)
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+        searched = self.client.get(url, {'q': 'stable'})
+        self.record.delete()
+        self.assertEqual(self.revalidate(url, searched, q='stable').status_code, 200)
+
+    def test_list_fingerprint_follows_owner_renames(self):
+        # someone other than the viewer, who is part of every ETag anyway
+        owner = User.objects.create_user(username='owner')
+        Record.objects.create(title='Owned', created_by=owner)
+        url = reverse('records_list')
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+        owner.username = 'renamed'
+        owner.save()
+        response = self.revalidate(url, first)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'renamed')
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', AUTH_USER_CACHE_TIMEOUT=60)
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='root', password='test-pass')
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.client.force_login(self.staff_user)
+        self.client.get(reverse('dashboard'))
+
+    def test_steady_state_dashboard_has_no_auth_queries(self):
+        # site_stats(), the latest records and the trend rows: nothing for the session or the user
+        with self.assertNumQueries(3):
+            self.client.get(reverse('dashboard'))
+
+    def test_role_change_reaches_the_cached_user(self):
+        admin_client = self.client_class()
+        admin_client.force_login(self.admin)
+        admin_client.post(reverse('toggle_staff', args=[self.staff_user.pk]))
+        self.assertEqual(self.client.get(reverse('records_list')).status_code, 302)
+
+    def test_password_change_ends_cached_sessions(self):
+        self.staff_user.set_password('new-pass')
+        self.staff_user.save()
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('dashboard')}", fetch_redirect_response=False)
+
+
+@override_settings(ACTIVITY_REFRESH_SECONDS=0)
+class DailyActivityTests(TestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staff', password='test-pass', is_staff=True)
+        self.client.force_login(self.staff_user)
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timedelta(days=1)
+
+    def test_writes_refresh_today_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record = Record.objects.create(title='a', created_by=self.staff_user)
+        row = DailyActivity.objects.get(day=self.today)
+        self.assertEqual((row.records_created, row.records_updated, row.users_joined), (1, 0, 1))
+        # an edit of a record created yesterday counts as today's update
+        Record.objects.filter(pk=record.pk).update(created_at=timezone.now() - timedelta(days=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            Record.objects.get(pk=record.pk).save()
+        row.refresh_from_db()
+        self.assertEqual((row.records_created, row.records_updated), (1, 1))
+
+    def test_counts_never_go_down(self):
+        record = Record.objects.create(title='a')
+        activity.refresh(self.today)
+        Record.objects.filter(pk=record.pk).update(created_at=timezone.now() - timedelta(days=3))
+        self.assertFalse(activity.refresh(self.today))
+        self.assertEqual(DailyActivity.objects.get(day=self.today).records_created, 1)
+
+    def test_backfill_command(self):
+        two_days_ago = timezone.now() - timedelta(days=2)
+        Record.objects.bulk_create(Record(title=f'r{i}') for i in range(3))
+        Record.objects.update(created_at=two_days_ago, updated_at=two_days_ago)
+        Record.objects.filter(pk=Record.objects.first().pk).update(updated_at=timezone.now())
+        out = io.StringIO()
+        call_command('backfill_activity', '--days', '5', stdout=out)
+        self.assertIn('Filled 5 day(s)', out.getvalue())
+        rows = {row.day: row for row in DailyActivity.objects.all()}
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[timezone.localdate(two_days_ago)].records_created, 3)
+        self.assertEqual(rows[self.today].records_updated, 1)
+
+    def test_dashboard_shows_trends(self):
+        DailyActivity.objects.create(day=self.yesterday, records_created=4)
+        DailyActivity.objects.create(day=self.today, records_created=2)
+        response = self.client.get(reverse('dashboard'), {'days': 90})
+        self.assertEqual(response.context['trend_days'], 90)
+        created = response.context['trends'][0]
+        self.assertEqual((created['total'], created['peak']), (6, 4))
+        self.assertEqual([bar['height'] for bar in created['bars'][-2:]], [100, 50])
+        self.assertContains(response, 'style="height: 50%"')
+        # anything but the offered ranges falls back to the default
+        self.assertEqual(self.client.get(reverse('dashboard'), {'days': 7}).context['trend_days'], 30)
+
+
+class CompressionTests(SimpleTestCase):
+    page = ('<ul>\n' + '    <li class="rounded-2xl border border-white/10">item</li>\n' * 50 + '</ul>').encode()
+
+    def respond(self, response, accept='gzip, deflate, br'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_negotiate(self):
+        self.assertEqual(compression.negotiate('gzip, deflate'), 'gzip')
+        self.assertIsNone(compression.negotiate('gzip;q=0, identity'))
+        self.assertIsNone(compression.negotiate(''))
+        self.assertEqual(compression.negotiate('*'), compression.encodings()[0])
+
+    def test_compresses_html(self):
+        original = HttpResponse(self.page)
+        original['ETag'] = '"abc"'
+        response = self.respond(original, accept='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.page)
+
+    def test_streaming(self):
+        chunks = [self.page] * 3
+        response = self.respond(StreamingHttpResponse(iter(chunks), content_type='application/x-ndjson'), accept='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+    def test_skipped_responses(self):
+        self.assertFalse(self.respond(HttpResponse('short')).has_header('Content-Encoding'))
+        self.assertFalse(self.respond(HttpResponse(self.page), accept='identity').has_header('Content-Encoding'))
+        self.assertFalse(self.respond(HttpResponse(self.page, content_type='image/png')).has_header('Content-Encoding'))
+        events = self.respond(StreamingHttpResponse(iter([b'data: 1\n\n']), content_type='text/event-stream'))
+        self.assertFalse(events.has_header('Content-Encoding'))
+        encoded = HttpResponse(self.page)
+        encoded['Content-Encoding'] = 'br'
+        self.assertEqual(self.respond(encoded).content, self.page)
+
+    def test_brotli_preferred_when_installed(self):
+        if compression.brotli is None:
+            self.skipTest('brotli is not installed')
+        response = self.respond(HttpResponse(self.page))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), self.page)
+
+    def test_compact_templates(self):
+        source = '<div>\n    <p>\n      {{ a }}\n    </p>\n\n<pre>\n  keep\n</pre>\n<script>\n  // keep\n  go();\n</script>\n</div>'
+        self.assertEqual(compact(source), '<div>\n<p>\n{{ a }}\n</p>\n<pre>\n  keep\n</pre>\n<script>\n  // keep\n  go();\n</script>\n</div>')
+
+
+class StaticPipelineTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        pipeline = override_settings(
+            STATIC_ROOT=self.root,
+            STATIC_PIPELINE=True,
+            STORAGES={**settings.STORAGES, 'staticfiles': {'BACKEND': 'website.storage.CompressedManifestStorage'}},
+        )
+        pipeline.enable()
+        self.addCleanup(pipeline.disable)
+        self.collect()
+        self.hashed = staticfiles_storage.stored_name('css/style.css')
+
+    def collect(self):
+        # the vendored bootstrap files point at source maps that aren't shipped
+        with self.assertLogs('website.storage', 'WARNING'):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+    def get(self, name, **headers):
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+        response = middleware(RequestFactory().get(f'/static/{name}', **headers))
+        self.addCleanup(response.close)
+        return response
+
+    def test_fingerprints_and_precompresses(self):
+        self.assertRegex(self.hashed, r'^css/style\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(os.path.join(self.root, self.hashed + '.gz')))
+        html = engines['django'].from_string("{% load static %}{% static 'css/style.css' %}").render()
+        self.assertEqual(html, f'/static/{self.hashed}')
+
+    def test_serves_hashed_files_immutable_and_compressed(self):
+        with open(os.path.join(self.root, 'css', 'style.css'), 'rb') as fh:
+            original = fh.read()
+        response = self.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), original)
+
+        plain = self.get('css/style.css')
+        self.assertEqual(plain['Cache-Control'], f'public, max-age={settings.STATIC_MAX_AGE}')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(plain.streaming_content), original)
+        self.assertEqual(self.get('css/style.css', HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304)
+        self.assertEqual(self.get('css/missing.css').status_code, 404)
+
+    def test_prunes_files_left_out_of_the_manifest(self):
+        stale = os.path.join(self.root, 'css', 'style.0123456789ab.css')
+        fresh = os.path.join(self.root, 'css', 'style.ba9876543210.css')
+        for path in (stale, fresh):
+            open(path, 'w').close()
+        long_ago = timezone.now().timestamp() - (settings.STATIC_PRUNE_DAYS + 1) * 86400
+        os.utime(stale, (long_ago, long_ago))
+        self.collect()
+        self.assertFalse(os.path.exists(stale))
+        # a deploy ago: pages rendered before it may still link here
+        self.assertTrue(os.path.exists(fresh))
+        self.assertTrue(os.path.exists(os.path.join(self.root, self.hashed)))
+
+
+@override_settings(PAGE_CACHE_SECONDS=30, PAGE_CACHE_STALE_SECONDS=60)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('home')
+        self.lock = pagecache._keys(RequestFactory().get(self.url))[1]
+
+    def test_anonymous_hits_skip_the_view(self):
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_sessions_and_messages_bypass(self):
+        self.client.get(self.url)
+        user = User.objects.create_user(username='reader', password='test-pass')
+        self.client.force_login(user)
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertContains(response, 'Dashboard')
+        self.client.logout()
+        self.client.cookies['messages'] = 'pending'
+        self.assertFalse(self.client.get(self.url).has_header('X-Page-Cache'))
+
+    def test_record_changes_invalidate(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Record.objects.create(title='Fresh launch plan')
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Fresh launch plan')
+
+    def test_stale_while_revalidate(self):
+        self.client.get(self.url)
+        pagecache.invalidate()
+        # another request is re-rendering: serve the old copy meanwhile
+        cache.add(self.lock, True)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'stale')
+        cache.delete(self.lock)
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'miss')
+
+    def test_single_flight_for_sync_and_async_views(self):
+        renders = []
+
+        def view(request):
+            renders.append(request.path)
+            return HttpResponse(f'page {len(renders)}')
+
+        async def async_view(request):
+            return view(request)
+
+        for wrapped in (pagecache.anonymous(view), async_to_sync(pagecache.anonymous(async_view))):
+            cache.clear()
+            renders.clear()
+            self.assertEqual(wrapped(RequestFactory().get('/x')).content, b'page 1')
+            self.assertEqual(wrapped(RequestFactory().get('/x')).content, b'page 1')
+            response = wrapped(RequestFactory().get('/x', HTTP_COOKIE=f'{settings.SESSION_COOKIE_NAME}=abc'))
+            self.assertEqual(response.content, b'page 2')
+            self.assertEqual(len(renders), 2)
@@ -1,22 +1,37 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, views
+
+# home, dashboard, record_detail and record_events have async twins for ASGI deployments
+pages = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', pages.home, name='home'),
     path('privacy', views.privacy, name='privacy'),
     path('terms', views.terms, name='terms'),
+    path('icons/sprite.svg', views.icon_sprite, name='icon_sprite'),
     path('login', views.login, name='login'),
     path('register', views.register, name='register'),
     path('logout', views.logout, name='logout'),
-    path('dashboard', views.dashboard, name='dashboard'),
+    path('dashboard', pages.dashboard, name='dashboard'),
     # Staff-only management
     path('manage/users', views.admin_users, name='admin_users'),
     path('manage/users/create', views.admin_user_create, name='admin_user_create'),
+    path('manage/users/roles', views.admin_users_roles, name='admin_users_roles'),
+    path('manage/users/<int:user_id>/delete-records', views.admin_user_delete_records, name='admin_user_delete_records'),
     path('manage/users/<int:user_id>/toggle-staff', views.toggle_staff, name='toggle_staff'),
     path('manage/users/<int:user_id>/toggle-superuser', views.toggle_superuser, name='toggle_superuser'),
     path('manage/records', views.records_list, name='records_list'),
     path('manage/records/create', views.record_create, name='record_create'),
-    path('manage/records/<int:pk>', views.record_detail, name='record_detail'),
+    path('manage/records/export', views.records_export, name='records_export'),
+    path('manage/records/events', pages.record_events, name='record_events'),
+    path('manage/records/<int:pk>', pages.record_detail, name='record_detail'),
+    path('manage/records/<int:pk>/card', views.record_card, name='record_card'),
     path('manage/records/<int:pk>/edit', views.record_update, name='record_update'),
     path('manage/records/<int:pk>/delete', views.record_delete, name='record_delete'),
+    path('manage/api/records', api.records, name='api_records'),
+    path('manage/api/records/changes', api.record_changes, name='api_record_changes'),
+    path('manage/jobs', views.jobs_list, name='jobs_list'),
+    path('manage/metrics', views.metrics_overview, name='metrics_overview'),
+    path('manage/metrics/prometheus', views.metrics_prometheus, name='metrics_prometheus'),
 ]
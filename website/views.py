@@ -1,3 +1,6 @@
+import csv
+import hmac
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
 from django.contrib import messages
@@ -5,27 +8,47 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.urls import reverse
-from django.db.models import Q
 from django.utils import timezone
-from datetime import timedelta
+from django.views.decorators.cache import cache_control
 from .forms import CreateUserForm, LoginForm, AdminCreateUserForm, RecordForm
-from .models import Record
-
-
+from . import activity, counters, jobs, pagecache, roles
+from .conditional import make_etag, not_modified, set_validators
+from .counters import site_stats
+from .metrics import TIME_BUCKETS_MS, registry as metrics_registry
+from .models import Job, Record
+from .pagination import KeysetPaginator
+from .search import search_records, search_users
+from .sqlite import retry_on_locked
+from .templatetags.ui_icons import sprite_sheet
+
+
+@pagecache.anonymous
 def home(request):
     # lightweight stats + recent content for homepage
-    total_users = User.objects.count()
-    total_records = Record.objects.count()
+    stats = site_stats()
     recent_records = list(Record.objects.select_related('created_by')[:6])
-    latest_record = recent_records[0] if recent_records else None
-    context = {
-        'total_users': total_users,
-        'total_records': total_records,
+    return render(request, 'pages/index.html', home_context(stats, recent_records))
+
+
+def home_context(stats, recent_records):
+    return {
+        'total_users': stats['total_users'],
+        'total_records': stats['total_records'],
         'recent_records': recent_records,
-        'latest_record': latest_record,
+        'latest_record': recent_records[0] if recent_records else None,
     }
-    return render(request, 'pages/index.html', context)
+
+
+@cache_control(public=True, max_age=31536000, immutable=True)
+def icon_sprite(request):
+    # URLs carry ?v=<content hash>, so the sheet can be cached forever
+    return HttpResponse(sprite_sheet(), content_type='image/svg+xml')
 
 
 def privacy(request):
@@ -39,7 +62,7 @@ def register(request):
     if request.method == 'POST':
         form = CreateUserForm(request.POST)
         if form.is_valid():
-            form.save()
+            retry_on_locked(form.save)()
             messages.success(request, 'Account created successfully! You can now log in.')
             return redirect('login')
     context = {'form': form}
@@ -66,24 +89,30 @@ def logout(request):
 @login_required(login_url="login")
 def dashboard(request):
     now = timezone.now()
-    week_ago = now - timedelta(days=7)
-    day_ago = now - timedelta(days=1)
+    site = site_stats(now)
+    latest_records = list(Record.objects.select_related('created_by')[:5]) if request.user.is_staff else []
+    trend = activity.trend(trend_days(request))
+    return render(request, 'pages/dashboard.html', dashboard_context(request, now, site, latest_records, trend))
+
+
+def trend_days(request):
+    days = request.GET.get('days', '')
+    return int(days) if days.isdigit() and int(days) in activity.TREND_DAYS else activity.TREND_DAYS[0]
 
-    total_users = User.objects.count()
-    new_users_week = User.objects.filter(date_joined__gte=week_ago).count()
-    active_24h = User.objects.filter(last_login__gte=day_ago).count()
+
+def dashboard_context(request, now, site, latest_records, trend):
     days_since_join = (now.date() - request.user.date_joined.date()).days
 
     stats = [
         {
             "label": "New Users (7d)",
-            "value": new_users_week,
+            "value": site["new_users_week"],
             "icon": "user-plus",
             "accent": "from-emerald-500/80 to-emerald-400/60",
         },
         {
             "label": "Active (24h)",
-            "value": active_24h,
+            "value": site["active_24h"],
             "icon": "bolt",
             "accent": "from-amber-500/80 to-orange-400/60",
         },
@@ -95,7 +124,7 @@ def dashboard(request):
         },
         {
             "label": "Total Users",
-            "value": total_users,
+            "value": site["total_users"],
             "icon": "users",
             "accent": "from-violet-500/80 to-purple-500/70",
         },
@@ -107,7 +136,6 @@ def dashboard(request):
     recent.append({"title": "Joined CRUD", "when": request.user.date_joined, "status": "Member"})
 
     quick_actions = []
-    latest_records = []
     if request.user.is_staff:
         quick_actions = [
             {
@@ -126,23 +154,63 @@ def dashboard(request):
                 "classes": "inline-flex items-center justify-center gap-2 rounded-xl border border-white/20 px-4 py-2 text-sm font-semibold text-white/85 transition hover:border-white/35 hover:bg-white/10",
             },
         ]
-        latest_records = list(Record.objects.select_related('created_by')[:5])
 
-    context = {
+    return {
         "stats": stats,
         "recent": recent,
         "quick_actions": quick_actions,
         "latest_records": latest_records,
+        "trend_days": len(trend),
+        "trend_choices": activity.TREND_DAYS,
+        "trends": activity.chart(trend),
     }
-    return render(request, 'pages/dashboard.html', context)
 
 
 # ----- Staff-only management views -----
 
+# each ordering is backed by an index on auth_user (migration 0004, or the username
+# unique constraint) and ends in a unique key, as KeysetPaginator needs
+USER_SORTS = {
+    '-date_joined': ('-date_joined', '-id'),
+    'date_joined': ('date_joined', 'id'),
+    '-last_login': ('-last_login', '-id'),
+    'last_login': ('last_login', 'id'),
+    'username': ('username',),
+    '-username': ('-username',),
+}
+USER_SORT_LABELS = (
+    ('-date_joined', 'Newest'),
+    ('date_joined', 'Oldest'),
+    ('-last_login', 'Recently active'),
+    ('last_login', 'Least active'),
+    ('username', 'Username A–Z'),
+    ('-username', 'Username Z–A'),
+)
+
 @staff_member_required(login_url='login')
 def admin_users(request):
-    users = User.objects.order_by('-date_joined')[:50]
-    return render(request, 'pages/admin_users.html', {"users": users})
+    query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort')
+    if sort not in USER_SORTS:
+        sort = '-date_joined'
+    # a correlated count per row instead of JOIN + GROUP BY: only the rows on the page
+    # are counted, each with a seek on record_owner_created_idx
+    record_count = Record.objects.filter(created_by=OuterRef('pk')).order_by().values('created_by')
+    users_qs = search_users(User.objects.all(), query).annotate(
+        record_count=Coalesce(Subquery(record_count.annotate(n=Count('id')).values('n')), 0),
+    )
+    paginator = KeysetPaginator(users_qs, ordering=USER_SORTS[sort], per_page=settings.USERS_PAGE_SIZE)
+    page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    context = {
+        "users": page.items,
+        "page": page,
+        "query": query,
+        "sort": sort,
+        "sorts": USER_SORT_LABELS,
+        "role_actions": roles.ACTION_LABELS,
+        "total_users": counters.value(counters.TOTAL_USERS),
+    }
+    return render(request, 'pages/admin_users.html', context)
 
 
 @staff_member_required(login_url='login')
@@ -152,33 +220,140 @@ def admin_user_create(request):
         user = form.save(commit=False)
         if not request.user.is_superuser:
             user.is_superuser = False
-        user.save()
+        retry_on_locked(user.save)()
         messages.success(request, f"User '{user.username}' created.")
         return redirect('admin_users')
     return render(request, 'pages/admin_user_create.html', {"form": form})
 
 
 @staff_member_required(login_url='login')
+def admin_user_delete_records(request, user_id: int):
+    if request.method != 'POST':
+        return redirect('admin_users')
+    target = User.objects.filter(pk=user_id).only('username').first()
+    if target is None:
+        messages.error(request, 'User not found.')
+        return redirect('admin_users')
+    jobs.enqueue('delete_records', created_by=request.user, owner=target.pk)
+    messages.success(request, f"Deleting {target.username}'s records in the background.")
+    return redirect('jobs_list')
+
+
+# maintenance any staff member may start from the jobs page
+MAINTENANCE_JOBS = (
+    ('rebuild_counters', 'Recount statistics'),
+    ('compact_changes', 'Compact change log'),
+)
+
+
+@staff_member_required(login_url='login')
+def jobs_list(request):
+    if request.method == 'POST':
+        name = request.POST.get('name')
+        if name in dict(MAINTENANCE_JOBS):
+            jobs.enqueue(name, created_by=request.user)
+            messages.success(request, f"{dict(MAINTENANCE_JOBS)[name]} queued.")
+        return redirect('jobs_list')
+
+    paginator = KeysetPaginator(Job.objects.select_related('created_by'), ordering=('-id',), per_page=50)
+    page = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+    by_status = dict(Job.objects.order_by().values_list('status').annotate(n=Count('id')))
+    context = {
+        "jobs": page.items,
+        "page": page,
+        "status_counts": [(label, by_status.get(status, 0)) for status, label in Job.STATUSES],
+        "maintenance": MAINTENANCE_JOBS,
+    }
+    return render(request, 'pages/jobs.html', context)
+
+
+@staff_member_required(login_url='login')
+@cache_control(private=True, no_cache=True)
 def records_list(request):
     query = request.GET.get('q', '').strip()
-    records_qs = Record.objects.select_related('created_by')
-    if query:
-        records_qs = records_qs.filter(
-            Q(title__icontains=query)
-            | Q(description__icontains=query)
-            | Q(created_by__username__icontains=query)
-        )
+    after, before = request.GET.get('after'), request.GET.get('before')
+    records_qs, ordering = search_records(Record.objects.select_related('created_by'), query)
 
-    records = list(records_qs)
-    total_records = Record.objects.count()
+    # fingerprint of the result set: any create/update/delete moves the max or the count
+    total_records = counters.value(counters.TOTAL_RECORDS)
+    if query:
+        latest, matches = records_qs.aggregate(Max('updated_at'), Count('id')).values()
+    else:
+        latest, matches = Record.objects.aggregate(Max('updated_at'))['updated_at__max'], total_records
+    paginator = KeysetPaginator(records_qs, ordering=ordering, per_page=settings.RECORDS_PAGE_SIZE)
+    page = paginator.page(after=after, before=before)
+    # cards show their owner's name, which a rename changes without touching the record (as in record_etag)
+    owners = [record.created_by.get_username() if record.created_by else None for record in page.items]
+    etag = make_etag(request, query, after, before, latest, matches, total_records, owners)
+    response = not_modified(request, etag, latest)
+    if response is not None:
+        return response
 
     context = {
-        "records": records,
+        "records": page.items,
+        "page": page,
         "query": query,
-        "matches": len(records),
+        "matches": matches,
         "total_records": total_records,
     }
-    return render(request, 'pages/records_list.html', context)
+    return set_validators(request, render(request, 'pages/records_list.html', context), etag, latest)
+
+
+@staff_member_required(login_url='login')
+def record_card(request, pk: int):
+    # the live records page swaps this in for a card when the record changes
+    record = get_object_or_404(Record.objects.select_related('created_by'), pk=pk)
+    return render(request, 'components/record_card.html', {"record": record})
+
+
+@staff_member_required(login_url='login')
+def record_events(request):
+    # an event stream would pin a WSGI worker thread for its whole life; live updates
+    # need the ASGI entry point (async_views.record_events). 204 tells EventSource to stop.
+    return HttpResponse(status=204)
+
+
+EXPORT_FIELDS = ('id', 'title', 'description', 'created_by__username', 'created_at', 'updated_at')
+EXPORT_HEADER = ('id', 'title', 'description', 'created_by', 'created_at', 'updated_at')
+
+
+class _Echo:
+    # csv.writer wants a file; hand each formatted line straight back instead
+    def write(self, value):
+        return value
+
+
+def _export_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _export_ndjson(rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(EXPORT_HEADER, row))) + '\n'
+
+
+@staff_member_required(login_url='login')
+def records_export(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        fmt = 'csv'
+    query = request.GET.get('q', '').strip()
+    records_qs, ordering = search_records(Record.objects.all(), query)
+    # tuples straight from the cursor, fetched chunk by chunk: memory stays flat
+    rows = records_qs.order_by(*ordering).values_list(*EXPORT_FIELDS).iterator(
+        chunk_size=settings.RECORDS_EXPORT_CHUNK_SIZE
+    )
+    if fmt == 'csv':
+        response = StreamingHttpResponse(_export_csv(rows), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(_export_ndjson(rows), content_type='application/x-ndjson')
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+    response['Content-Disposition'] = f'attachment; filename="records-{stamp}.{fmt}"'
+    return response
 
 
 @staff_member_required(login_url='login')
@@ -187,16 +362,27 @@ def record_create(request):
     if request.method == 'POST' and form.is_valid():
         rec = form.save(commit=False)
         rec.created_by = request.user
-        rec.save()
+        retry_on_locked(rec.save)()
         messages.success(request, 'Record created.')
         return redirect('records_list')
     return render(request, 'pages/record_form.html', {"form": form, "is_edit": False, "record": None})
 
 
 @staff_member_required(login_url='login')
+@cache_control(private=True, no_cache=True)
 def record_detail(request, pk: int):
     record = get_object_or_404(Record.objects.select_related('created_by'), pk=pk)
-    return render(request, 'pages/record_detail.html', {"record": record})
+    etag = record_etag(request, record)
+    response = not_modified(request, etag, record.updated_at)
+    if response is not None:
+        return response
+    response = render(request, 'pages/record_detail.html', {"record": record})
+    return set_validators(request, response, etag, record.updated_at)
+
+
+def record_etag(request, record):
+    owner = record.created_by.get_username() if record.created_by else None
+    return make_etag(request, record.pk, record.updated_at, owner)
 
 
 @staff_member_required(login_url='login')
@@ -205,7 +391,7 @@ def record_update(request, pk: int):
     form = RecordForm(request.POST or None, instance=record)
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            retry_on_locked(form.save)()
             messages.success(request, 'Record updated.')
             return redirect('record_detail', pk=record.pk)
         messages.error(request, 'Please fix the errors below to update this record.')
@@ -217,22 +403,45 @@ def record_delete(request, pk: int):
     record = get_object_or_404(Record, pk=pk)
     if request.method == 'POST':
         title = record.title
-        record.delete()
+        retry_on_locked(record.delete)()
         messages.success(request, f"Deleted record '{title}'.")
         return redirect('records_list')
     cancel_url = request.GET.get('next') or reverse('record_detail', kwargs={'pk': record.pk})
     return render(request, 'pages/record_confirm_delete.html', {"record": record, "cancel_url": cancel_url})
 
 
+# ----- Request metrics -----
+
+@staff_member_required(login_url='login')
+def metrics_overview(request):
+    rows = sorted(metrics_registry.summary(), key=lambda row: row['p95_ms'] or 0, reverse=True)
+    context = {
+        "rows": rows,
+        "sample_rate": settings.METRICS_SAMPLE_RATE,
+        "slow_ms": settings.METRICS_SLOW_REQUEST_MS,
+        "top_bucket": TIME_BUCKETS_MS[-1],
+    }
+    return render(request, 'pages/metrics.html', context)
+
+
+def metrics_prometheus(request):
+    # scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; staff can just look
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    authorized = bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+    if not authorized and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden('Forbidden', content_type='text/plain')
+    return HttpResponse(metrics_registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # ----- Role toggle actions -----
 
 @user_passes_test(lambda u: u.is_superuser, login_url='login')
 def toggle_staff(request, user_id: int):
     if request.method != 'POST':
         return redirect('admin_users')
-    try:
-        target = User.objects.get(pk=user_id)
-    except User.DoesNotExist:
+    target = User.objects.filter(pk=user_id).only('username', 'is_staff').first()
+    if target is None:
         messages.error(request, 'User not found.')
         return redirect('admin_users')
 
@@ -240,9 +449,9 @@ def toggle_staff(request, user_id: int):
         messages.error(request, "You can't change your own staff status here.")
         return redirect('admin_users')
 
-    target.is_staff = not target.is_staff
-    target.save()
-    messages.success(request, f"{'Granted' if target.is_staff else 'Removed'} admin (staff) for {target.username}.")
+    granted = not target.is_staff
+    roles.change_roles(request.user, [target.pk], 'grant_staff' if granted else 'revoke_staff')
+    messages.success(request, f"{'Granted' if granted else 'Removed'} admin (staff) for {target.username}.")
     return redirect('admin_users')
 
 
@@ -250,9 +459,8 @@ def toggle_staff(request, user_id: int):
 def toggle_superuser(request, user_id: int):
     if request.method != 'POST':
         return redirect('admin_users')
-    try:
-        target = User.objects.get(pk=user_id)
-    except User.DoesNotExist:
+    target = User.objects.filter(pk=user_id).only('username', 'is_superuser').first()
+    if target is None:
         messages.error(request, 'User not found.')
         return redirect('admin_users')
 
@@ -261,17 +469,26 @@ def toggle_superuser(request, user_id: int):
         messages.error(request, "You can't remove your own superuser status here.")
         return redirect('admin_users')
 
-    if target.is_superuser:
-        # Prevent removing the last superuser in the system
-        total_supers = User.objects.filter(is_superuser=True).count()
-        if total_supers <= 1:
-            messages.error(request, 'Cannot remove the last superuser.')
-            return redirect('admin_users')
-        target.is_superuser = False
-        # Also drop staff if not desired, but keep current staff state
-    else:
-        target.is_superuser = True
-        target.is_staff = True  # superusers should be staff as well
-    target.save()
-    messages.success(request, f"{('Granted' if target.is_superuser else 'Removed')} superuser for {target.username}.")
+    granted = not target.is_superuser
+    changed = roles.change_roles(request.user, [target.pk], 'grant_superuser' if granted else 'revoke_superuser')
+    if not changed and not granted:
+        messages.error(request, 'Cannot remove the last superuser.')
+        return redirect('admin_users')
+    messages.success(request, f"{('Granted' if granted else 'Removed')} superuser for {target.username}.")
+    return redirect('admin_users')
+
+
+@user_passes_test(lambda u: u.is_superuser, login_url='login')
+def admin_users_roles(request):
+    if request.method != 'POST':
+        return redirect('admin_users')
+    action = request.POST.get('action')
+    user_ids = [pk for pk in request.POST.getlist('user_ids') if pk.isdigit()]
+    if action not in roles.ACTIONS or not user_ids:
+        messages.error(request, 'Pick at least one user and an action.')
+        return redirect('admin_users')
+
+    changed = roles.change_roles(request.user, user_ids, action)
+    label = dict(roles.ACTION_LABELS)[action]
+    messages.success(request, f"{label}: {changed} user{'s' if changed != 1 else ''} updated.")
     return redirect('admin_users')